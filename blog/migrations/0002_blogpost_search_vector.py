@@ -0,0 +1,46 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+BLOGPOST_TRIGGER = """
+CREATE FUNCTION blog_blogpost_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.body, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_blogpost_search_vector
+    BEFORE INSERT OR UPDATE OF title, body ON blog_blogpost
+    FOR EACH ROW EXECUTE FUNCTION blog_blogpost_search_vector();
+
+UPDATE blog_blogpost SET title = title;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blogpost_search_idx'),
+        ),
+        migrations.RunSQL(
+            BLOGPOST_TRIGGER,
+            reverse_sql='DROP TRIGGER blog_blogpost_search_vector ON blog_blogpost; '
+                        'DROP FUNCTION blog_blogpost_search_vector();',
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 NULLABLE = {'blank': True, 'null': True}
@@ -9,6 +11,8 @@ class BlogPost(models.Model):
     preview = models.ImageField(upload_to="blog/%Y/%m", verbose_name="Изображение", **NULLABLE)
     date_published = models.DateField(auto_now_add=True, verbose_name="Дата публикации")
     count_views = models.IntegerField(default=0, verbose_name="Количество просмотров")
+    # Заполняется триггером в базе, см. миграцию 0002_blogpost_search_vector
+    search_vector = SearchVectorField(editable=False, **NULLABLE)
 
     def __str__(self):
         return self.title
@@ -17,3 +21,6 @@ class BlogPost(models.Model):
         verbose_name = "Запись в блоге"
         verbose_name_plural = "Записи в блоге"
         ordering = ['date_published']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blogpost_search_idx'),
+        ]
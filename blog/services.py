@@ -1,15 +1,149 @@
+import atexit
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connections
+from django.db.models import Min, Max, F
+from django.db.models.functions import Substr
 
 from blog.models import BlogPost
-from config.settings import CACHE_ENABLED
+
+
+# Список хранит только то, что выводится на странице блога, пост целиком кэшируется отдельно
+POST_LIST_FIELDS = ('id', 'title', 'body', 'date_published')
+POST_FIELDS = ('id', 'title', 'body', 'preview', 'date_published', 'count_views')
+POST_LIST_BODY_LENGTH = 100
+POSTS_VERSION_KEY = 'blog:posts:version'
+
+
+def _new_posts_version():
+    # Версия после вытеснения ключа не должна совпасть с прежней, иначе вернутся устаревшие записи
+    return time.time_ns()
+
+
+def get_posts_version():
+    version = cache.get(POSTS_VERSION_KEY)
+    if version is None:
+        new_version = _new_posts_version()
+        cache.add(POSTS_VERSION_KEY, new_version, None)
+        version = cache.get(POSTS_VERSION_KEY, new_version)
+    return version
+
+
+def bump_posts_version():
+    """Делает недействительными все закэшированные посты, вызывается при изменении любого поста"""
+    try:
+        cache.incr(POSTS_VERSION_KEY)
+    except ValueError:
+        cache.set(POSTS_VERSION_KEY, _new_posts_version(), None)
+
+
+def _build_posts(fields, rows):
+    return [BlogPost.from_db('default', fields, row) for row in rows]
 
 
 def get_posts_from_cache():
-    if not CACHE_ENABLED:
-        return BlogPost.objects.all()
-    posts = cache.get('posts_list')
-    if posts is not None:
-        return posts
-    posts = BlogPost.objects.all()
-    cache.set('posts_list', posts)
+    """
+    Посты для страницы блога. В кэше лежат кортежи значений, а не QuerySet,
+    текст поста обрезан до длины анонса.
+    """
+    queryset = BlogPost.objects.annotate(
+        body_preview=Substr('body', 1, POST_LIST_BODY_LENGTH),
+    ).values_list('id', 'title', 'body_preview', 'date_published')
+    key = f'blog:posts:{get_posts_version()}:list'
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(queryset)
+        cache.set(key, rows, settings.BLOG_CACHE_TIMEOUT)
+    return _build_posts(POST_LIST_FIELDS, rows)
+
+
+def get_post_from_cache(pk):
+    """
+    Пост для страницы просмотра, None если поста нет.
+    Просмотры пишутся в базу без сигналов, поэтому count_views в кэше отстаёт не дольше BLOG_CACHE_TIMEOUT.
+    """
+    queryset = BlogPost.objects.filter(pk=pk).values_list(*POST_FIELDS)
+    key = f'blog:posts:{get_posts_version()}:{pk}'
+    row = cache.get(key)
+    if row is None:
+        row = queryset.first()
+        if row is not None:
+            cache.set(key, row, settings.BLOG_CACHE_TIMEOUT)
+    return None if row is None else _build_posts(POST_FIELDS, [row])[0]
+
+
+def get_random_posts(count=3):
+    """
+    Несколько случайных постов без сортировки всей таблицы:
+    случайные точки в диапазоне id, от каждой берётся ближайший пост по индексу первичного ключа.
+    """
+    bounds = BlogPost.objects.aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+    if bounds['min_pk'] is None:
+        return []
+
+    starts = random.sample(range(bounds['min_pk'], bounds['max_pk'] + 1),
+                           min(count, bounds['max_pk'] - bounds['min_pk'] + 1))
+    querysets = [BlogPost.objects.filter(pk__gte=start).order_by('pk')[:1] for start in starts]
+    posts = list(querysets[0].union(*querysets[1:]))
+
+    # Несколько точек могли попасть на один и тот же пост
+    if len(posts) < count:
+        posts += BlogPost.objects.exclude(pk__in=[post.pk for post in posts]).order_by('pk')[:count - len(posts)]
+    random.shuffle(posts)
     return posts
+
+
+_pending_views = Counter()
+_pending_views_lock = threading.Lock()
+_flusher = None
+
+
+def register_view(pk):
+    """
+    Учитывает просмотр поста в памяти процесса и возвращает число ещё не записанных просмотров этого поста.
+    В базу просмотры пишутся пачками фоновым потоком раз в BLOG_VIEWS_FLUSH_SECONDS.
+    """
+    global _flusher
+    with _pending_views_lock:
+        _pending_views[pk] += 1
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_views_periodically, daemon=True)
+            _flusher.start()
+            atexit.register(flush_views)
+        return _pending_views[pk]
+
+
+def flush_views():
+    with _pending_views_lock:
+        views = dict(_pending_views)
+        _pending_views.clear()
+    if not views:
+        return
+
+    # Посты с одинаковым приростом обновляются одним запросом
+    posts_by_increment = defaultdict(list)
+    for pk, increment in views.items():
+        posts_by_increment[increment].append(pk)
+    try:
+        for increment, pks in posts_by_increment.items():
+            BlogPost.objects.filter(pk__in=pks).update(count_views=F('count_views') + increment)
+    except Exception:
+        with _pending_views_lock:
+            _pending_views.update(views)
+        raise
+
+
+def _flush_views_periodically():
+    while True:
+        time.sleep(settings.BLOG_VIEWS_FLUSH_SECONDS)
+        try:
+            flush_views()
+        except Exception as e:
+            print(f'Не удалось записать просмотры постов: {e}')
+        finally:
+            connections.close_all()
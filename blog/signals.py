@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blog.models import BlogPost
+from blog.services import bump_posts_version
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_posts_cache(sender, **kwargs):
+    bump_posts_version()
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, tag
+
+from blog import urls
+from config.cache import TieredCache
+from config.testing import PageBudgetMixin
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = TieredCache(None, {'KEY_PREFIX': 'tiered-cache-test', 'OPTIONS': {'L1_TIMEOUT': 5}})
+        self.cache.clear()
+
+    def test_stores_copies(self):
+        response = HttpResponse('текст')
+        self.cache.set('page', response)
+        response['Server-Timing'] = 'total;dur=1'
+
+        cached = self.cache.get('page')
+        self.assertFalse(cached.has_header('Server-Timing'))
+        cached['Vary'] = 'Cookie'
+        self.assertFalse(self.cache.get('page').has_header('Vary'))
+
+    def test_local_timeout_is_capped_without_redis(self):
+        with mock.patch('config.cache.time.monotonic', return_value=1000):
+            self.cache.set('version', 1, None)
+            self.cache.incr('version')
+        with mock.patch('config.cache.time.monotonic', return_value=1004):
+            self.assertEqual(self.cache.get('version'), 2)
+        with mock.patch('config.cache.time.monotonic', return_value=1006):
+            self.assertIsNone(self.cache.get('version'))
+
+
+@tag('performance')
+class BlogPageBudgetTest(PageBudgetMixin, TestCase):
+    url_module = urls
+    pages = {
+        'blog:create_post': (None, 4),
+        'blog:view_list': (None, 5),
+        'blog:view_post': (lambda data: {'pk': data.post.pk}, 5),
+        'blog:edit_post': (lambda data: {'pk': data.post.pk}, 5),
+        'blog:delete_post': (lambda data: {'pk': data.post.pk}, 5),
+    }
@@ -1,9 +1,10 @@
+from django.http import Http404
 from django.urls import reverse_lazy
 from django.urls.base import reverse
 from django.views.generic import DetailView, CreateView, ListView, UpdateView, DeleteView
 
 from blog.models import BlogPost
-from blog.services import get_posts_from_cache
+from blog.services import get_posts_from_cache, get_post_from_cache, register_view
 
 
 class PostCreateView(CreateView):
@@ -14,7 +15,7 @@ class PostCreateView(CreateView):
 
 class PostListView(ListView):
     model = BlogPost
-    ordering = ['date_published']
+    template_name = 'blog/blogpost_list.html'
 
     def get_queryset(self):
         return get_posts_from_cache()
@@ -24,9 +25,10 @@ class PostDetailView(DetailView):
     model = BlogPost
 
     def get_object(self, queryset=None):
-        self.object = super().get_object(queryset)
-        self.object.count_views += 1
-        self.object.save()
+        self.object = get_post_from_cache(self.kwargs.get('pk'))
+        if self.object is None:
+            raise Http404('Пост не найден')
+        self.object.count_views += register_view(self.object.pk)
         return self.object
 
 
@@ -0,0 +1,263 @@
+import os
+import pickle
+import socket
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+MISSING = object()
+
+# Счётчики попаданий текущего запроса, их заводит config.middleware.PerformanceMiddleware
+request_stats = ContextVar('cache_request_stats', default=None)
+
+
+class LocalLRUCache:
+    """
+    Ограниченный по числу записей кэш в памяти процесса, при переполнении вытесняются давно не читанные.
+    Как и LocMemCache, хранит копии значений через pickle: объекты вроде HttpResponse из cache_page
+    иначе были бы общими для потоков и менялись бы обработчиками запроса.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (MISSING, None))
+            if value is MISSING:
+                return MISSING
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (value, None if timeout is None else time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, timeout):
+        if self.has_key(key):
+            return False
+        self.set(key, value, timeout)
+        return True
+
+    def has_key(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (MISSING, None))
+            return value is not MISSING and (expires_at is None or expires_at > time.monotonic())
+
+    def incr(self, key, delta):
+        with self._lock:
+            value, expires_at = self._data.get(key, (MISSING, None))
+            if value is MISSING or (expires_at is not None and expires_at <= time.monotonic()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(value) + delta
+            self._data[key] = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+            return value
+
+    def touch(self, key, timeout):
+        if not self.has_key(key):
+            return False
+        with self._lock:
+            value, _ = self._data[key]
+            self._data[key] = (value, None if timeout is None else time.monotonic() + timeout)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, MISSING) is not MISSING
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedState:
+    """L1, статистика и подписка на сброс общие для всех потоков процесса"""
+
+    def __init__(self, max_entries):
+        self.local = LocalLRUCache(max_entries)
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self.listener = None
+        self.listener_lock = threading.Lock()
+
+
+_shared_states = {}
+_shared_states_lock = threading.Lock()
+
+
+def get_shared_state(name, max_entries):
+    with _shared_states_lock:
+        if name not in _shared_states:
+            _shared_states[name] = SharedState(max_entries)
+        return _shared_states[name]
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кэш: L1 в памяти процесса перед необязательным L2 в Redis.
+    С Redis изменения ключей рассылаются остальным процессам через pub/sub.
+    Без LOCATION работает только L1, и у каждого процесса свой кэш: изменения, сделанные в другом процессе,
+    становятся видны после истечения записи. Поэтому в обоих режимах время жизни записи в L1
+    ограничено L1_TIMEOUT, это и есть наибольшая задержка, если сообщение потеряно или Redis не используется.
+
+    OPTIONS: L1_MAX_ENTRIES, L1_TIMEOUT, CHANNEL и REDIS (параметры клиента Redis).
+    Django создаёт экземпляр кэша на каждый поток, поэтому L1 и статистика хранятся в общем для процесса SharedState.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._local_timeout = options.get('L1_TIMEOUT', 5)
+        self._remote = RedisCache(location, {**params, 'OPTIONS': options.get('REDIS', {})}) if location else None
+        self._channel = options.get('CHANNEL', 'cache:invalidate')
+        self._id = f'{socket.gethostname()}:{os.getpid()}'
+        self._shared = get_shared_state(f'{location}|{self.key_prefix}|{self._channel}',
+                                        options.get('L1_MAX_ENTRIES', 1000))
+        self._local = self._shared.local
+
+    def get_stats(self):
+        """Попадания в L1 и L2 и промахи этого процесса"""
+        with self._shared.stats_lock:
+            return {name: self._shared.stats[name] for name in ('l1_hits', 'l2_hits', 'misses')}
+
+    def reset_stats(self):
+        with self._shared.stats_lock:
+            self._shared.stats.clear()
+
+    def get(self, key, default=None, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        value = self._local.get(full_key)
+        if value is not MISSING:
+            self._count('l1_hits')
+            return value
+
+        if self._remote is not None:
+            self._listen()
+            value = self._remote.get(key, MISSING, version)
+            if value is not MISSING:
+                self._count('l2_hits')
+                self._local.set(full_key, value, self._local_timeout)
+                return value
+
+        self._count('misses')
+        return default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        if self._remote is not None:
+            self._remote.set(key, value, timeout, version)
+            self._publish(full_key)
+        self._local.set(full_key, value, self._get_local_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        if self._remote is None:
+            return self._local.add(full_key, value, self._get_local_timeout(timeout))
+        if not self._remote.add(key, value, timeout, version):
+            return False
+        self._publish(full_key)
+        self._local.set(full_key, value, self._get_local_timeout(timeout))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        if self._remote is None:
+            return self._local.touch(full_key, self._get_local_timeout(timeout))
+        self._local.delete(full_key)
+        return self._remote.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        deleted = self._local.delete(full_key)
+        if self._remote is not None:
+            deleted = self._remote.delete(key, version)
+            self._publish(full_key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        if self._local.has_key(full_key):
+            return True
+        return self._remote is not None and self._remote.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        full_key = self.make_and_validate_key(key, version)
+        if self._remote is None:
+            return self._local.incr(full_key, delta)
+        # Счётчик меняется атомарно в Redis, в L1 он перечитается при следующем обращении
+        value = self._remote.incr(key, delta, version)
+        self._local.delete(full_key)
+        self._publish(full_key)
+        return value
+
+    def clear(self):
+        self._local.clear()
+        if self._remote is not None:
+            self._remote.clear()
+            self._publish('*')
+
+    def close(self, **kwargs):
+        if self._remote is not None:
+            self._remote.close(**kwargs)
+
+    def _get_local_timeout(self, timeout):
+        # get_backend_timeout возвращает абсолютное время, для L1 нужен срок в секундах
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is not None:
+            timeout = max(timeout, 0)
+        return self._local_timeout if timeout is None else min(timeout, self._local_timeout)
+
+    def _count(self, name):
+        with self._shared.stats_lock:
+            self._shared.stats[name] += 1
+        stats = request_stats.get()
+        if stats is not None:
+            stats[name] += 1
+
+    def _publish(self, full_key):
+        self._listen()
+        self._get_redis().publish(self._channel, f'{self._id} {full_key}')
+
+    def _get_redis(self):
+        return self._remote._cache.get_client(write=True)
+
+    def _listen(self):
+        if self._shared.listener is not None:
+            return
+        with self._shared.listener_lock:
+            if self._shared.listener is None:
+                self._shared.listener = threading.Thread(target=self._listen_forever, daemon=True)
+                self._shared.listener.start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                pubsub = self._get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # Сообщения, пропущенные до переподключения, не восстановить, поэтому L1 сбрасывается целиком
+                self._local.clear()
+                for message in pubsub.listen():
+                    sender, _, full_key = message['data'].decode().partition(' ')
+                    if sender == self._id:
+                        continue
+                    if full_key == '*':
+                        self._local.clear()
+                    else:
+                        self._local.delete(full_key)
+            except Exception as e:
+                print(f'Потеряна подписка на сброс кэша: {e}')
+                time.sleep(1)
@@ -0,0 +1,142 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from config.cache import request_stats
+
+logger = logging.getLogger('config.performance')
+
+_aggregates = {}
+_aggregates_lock = threading.Lock()
+
+
+def get_aggregates():
+    """Сводка по именам url этого процесса: число запросов, среднее и максимальное время, SQL и медленные"""
+    with _aggregates_lock:
+        return {
+            name: {
+                'requests': values['requests'],
+                'avg_ms': round(values['total_ms'] / values['requests'], 2),
+                'max_ms': round(values['max_ms'], 2),
+                'avg_queries': round(values['queries'] / values['requests'], 2),
+                'avg_db_ms': round(values['db_ms'] / values['requests'], 2),
+                'cache_hits': values['cache_hits'],
+                'cache_misses': values['cache_misses'],
+                'slow': values['slow'],
+            }
+            for name, values in _aggregates.items()
+        }
+
+
+def reset_aggregates():
+    with _aggregates_lock:
+        _aggregates.clear()
+
+
+class QueryTimer:
+    """Обёртка выполнения SQL: число и суммарное время запросов, текст первых max_queries запросов"""
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            if len(self.queries) < self.max_queries:
+                self.queries.append((duration, sql))
+
+
+class PerformanceMiddleware:
+    """
+    Замеры каждого запроса: число и время SQL, попадания в кэш, время отрисовки шаблона и общее время.
+    Результат отдаётся в заголовке Server-Timing и копится в сводке по имени url,
+    медленные запросы вместе с их SQL пишутся в лог config.performance.
+
+    Шаблон замеряется только у TemplateResponse, то есть у представлений на классах.
+    Должен стоять первым в MIDDLEWARE, чтобы общее время включало остальные обработчики.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = settings.PERF_SLOW_REQUEST_MS
+        self.slow_sample_rate = settings.PERF_SLOW_SAMPLE_RATE
+        self.max_logged_queries = settings.PERF_MAX_LOGGED_QUERIES
+
+    def __call__(self, request):
+        request.template_ms = 0.0
+        timer = QueryTimer(self.max_logged_queries)
+        cache_stats = Counter()
+        token = request_stats.set(cache_stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        db_ms = timer.duration * 1000
+        cache_hits = cache_stats['l1_hits'] + cache_stats['l2_hits']
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{timer.count} queries"',
+            f'cache;desc="{cache_hits} hits, {cache_stats["misses"]} misses"',
+            f'template;dur={request.template_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        name = resolver_match.view_name if resolver_match else 'unresolved'
+        is_slow = total_ms >= self.slow_ms
+        self.aggregate(name, total_ms, timer, db_ms, cache_hits, cache_stats['misses'], is_slow)
+        if is_slow and random.random() < self.slow_sample_rate:
+            self.log_slow_request(request, response, name, total_ms, timer, db_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        # Шаблон отрисовывается сразу после этого обработчика, конец отрисовки отмечает post_render callback
+        started = time.perf_counter()
+
+        def finish_rendering(rendered_response):
+            request.template_ms += (time.perf_counter() - started) * 1000
+
+        response.add_post_render_callback(finish_rendering)
+        return response
+
+    @staticmethod
+    def aggregate(name, total_ms, timer, db_ms, cache_hits, cache_misses, is_slow):
+        with _aggregates_lock:
+            values = _aggregates.setdefault(name, Counter())
+            values['requests'] += 1
+            values['total_ms'] += total_ms
+            values['max_ms'] = max(values['max_ms'], total_ms)
+            values['queries'] += timer.count
+            values['db_ms'] += db_ms
+            values['cache_hits'] += cache_hits
+            values['cache_misses'] += cache_misses
+            values['slow'] += is_slow
+
+    @staticmethod
+    def log_slow_request(request, response, name, total_ms, timer, db_ms):
+        queries = '\n'.join(f'  {duration * 1000:.1f} мс: {sql}' for duration, sql in timer.queries)
+        logger.warning('Медленный запрос %s %s (%s): %d, %.1f мс, SQL %d запросов за %.1f мс\n%s',
+                       request.method, request.get_full_path(), name, response.status_code, total_ms,
+                       timer.count, db_ms, queries)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'email_list',
     'users',
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -151,11 +153,72 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool)
 EMAIL_USE_SSL = config('EMAIL_USE_SSL', cast=bool)
 
+EMAIL_POOL_SIZE = config('EMAIL_POOL_SIZE', default=4, cast=int)
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)
+EMAIL_KEEPALIVE_SECONDS = config('EMAIL_KEEPALIVE_SECONDS', default=30, cast=int)
+# Ограничение общее для сервера: каждый из EMAIL_RATE_WORKERS отправляющих процессов (run_dispatcher, mail,
+# runserver с планировщиком) получает свою долю EMAIL_RATE_LIMIT и EMAIL_RATE_BURST
+EMAIL_RATE_LIMIT = config('EMAIL_RATE_LIMIT', default=0, cast=float)
+EMAIL_RATE_BURST = config('EMAIL_RATE_BURST', default=0, cast=int)
+EMAIL_RATE_WORKERS = config('EMAIL_RATE_WORKERS', default=1, cast=int)
+
+MAILING_CONCURRENCY = config('MAILING_CONCURRENCY', default=4, cast=int)
+DELIVERY_LOG_BATCH_SIZE = config('DELIVERY_LOG_BATCH_SIZE', default=1000, cast=int)
+RECIPIENT_CHUNK_SIZE = config('RECIPIENT_CHUNK_SIZE', default=2000, cast=int)
+
+# Журнал доставок хранится помесячными секциями, старые секции выгружаются в архив и удаляются
+DELIVERY_PARTITIONS_AHEAD = config('DELIVERY_PARTITIONS_AHEAD', default=3, cast=int)
+DELIVERY_RETENTION_MONTHS = config('DELIVERY_RETENTION_MONTHS', default=12, cast=int)
+DELIVERY_ARCHIVE_DIR = config('DELIVERY_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
+MAILING_IN_PROCESS_SCHEDULER = config('MAILING_IN_PROCESS_SCHEDULER', default=True, cast=bool)
+MAILING_CLAIM_BATCH_SIZE = config('MAILING_CLAIM_BATCH_SIZE', default=20, cast=int)
+MAILING_LEASE_SECONDS = config('MAILING_LEASE_SECONDS', default=1800, cast=int)
+
+MAILING_USE_OUTBOX = config('MAILING_USE_OUTBOX', default=False, cast=bool)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=300, cast=int)
+OUTBOX_MAX_RETRIES = config('OUTBOX_MAX_RETRIES', default=5, cast=int)
+OUTBOX_RETRY_BASE_SECONDS = config('OUTBOX_RETRY_BASE_SECONDS', default=60, cast=int)
+OUTBOX_RETRY_MAX_SECONDS = config('OUTBOX_RETRY_MAX_SECONDS', default=3600, cast=int)
+
+# Файл с дополнительными запрещёнными словами, по одному в строке
+CONTENT_FILTER_WORDS_FILE = config('CONTENT_FILTER_WORDS_FILE', default='')
+# Как часто процесс сверяет версию списка слов с базой, секунд
+CONTENT_FILTER_CHECK_SECONDS = config('CONTENT_FILTER_CHECK_SECONDS', default=10, cast=int)
+
+CLIENT_IMPORT_BATCH_SIZE = config('CLIENT_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+BLOG_CACHE_TIMEOUT = config('BLOG_CACHE_TIMEOUT', default=300, cast=int)
+BLOG_VIEWS_FLUSH_SECONDS = config('BLOG_VIEWS_FLUSH_SECONDS', default=30, cast=int)
+
+# Без Redis кэш работает только в памяти процесса, с Redis он становится вторым уровнем.
+# Без Redis изменения из другого процесса (воркера gunicorn) видны через CACHE_L1_TIMEOUT секунд
 CACHE_ENABLED = config('CACHE_ENABLED', cast=bool)
-if CACHE_ENABLED:
-    CACHES = {
-        "default":{
-            "BACKEND": "django.core.cache.backends.redis.RedisCache",
-            "LOCATION": config('REDIS_URL'),
-        }
+CACHES = {
+    "default": {
+        "BACKEND": "config.cache.TieredCache",
+        "LOCATION": config('REDIS_URL') if CACHE_ENABLED else '',
+        "OPTIONS": {
+            "L1_MAX_ENTRIES": config('CACHE_L1_MAX_ENTRIES', default=1000, cast=int),
+            "L1_TIMEOUT": config('CACHE_L1_TIMEOUT', default=5, cast=int),
+        },
     }
+}
+
+# Замеры запросов: заголовок Server-Timing, сводка по url на /perf/ и лог медленных запросов с их SQL
+PERF_INSTRUMENTATION = config('PERF_INSTRUMENTATION', default=True, cast=bool)
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=500, cast=int)
+PERF_SLOW_SAMPLE_RATE = config('PERF_SLOW_SAMPLE_RATE', default=1.0, cast=float)
+PERF_MAX_LOGGED_QUERIES = config('PERF_MAX_LOGGED_QUERIES', default=50, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'config.performance': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
@@ -0,0 +1,226 @@
+import json
+import os
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from blog.models import BlogPost
+from email_list.models import Client, MailingMessage, MailingSettings, Attempt, Delivery, DeliveryStat, Segment
+from email_list.services import reconcile_counters
+from users.models import User
+
+GROUPS_FIXTURE = settings.BASE_DIR / 'groups.json'
+
+# Объём синтетических данных: при PERF_SCALE=10 записей в десять раз больше, бюджеты запросов от него не зависят
+PERF_SCALE = int(os.environ.get('PERF_SCALE', 1))
+PERF_REPEAT = int(os.environ.get('PERF_REPEAT', 5))
+# Отчёт с числом запросов и временем ответа дописывается в PERF_OUTPUT,
+# с PERF_BASELINE медиана времени сравнивается с сохранённым ранее отчётом
+PERF_OUTPUT = os.environ.get('PERF_OUTPUT')
+PERF_BASELINE = os.environ.get('PERF_BASELINE')
+PERF_TOLERANCE = float(os.environ.get('PERF_TOLERANCE', 1.5))
+PERF_SLACK_MS = float(os.environ.get('PERF_SLACK_MS', 5))
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def load_groups(path=GROUPS_FIXTURE):
+    """
+    Группы пользователей из groups.json.
+    Права ищутся по кодовому имени: id прав и типов содержимого в тестовой базе не совпадают с фикстурой.
+    """
+    with open(path, encoding='cp1251') as fixture:
+        objects = json.load(fixture)
+    codenames = {obj['pk']: obj['fields']['codename'] for obj in objects if obj['model'] == 'auth.permission'}
+
+    groups = {}
+    for obj in objects:
+        if obj['model'] != 'auth.group':
+            continue
+        group, _ = Group.objects.get_or_create(name=obj['fields']['name'])
+        group.permissions.set(Permission.objects.filter(
+            codename__in=[codenames[pk] for pk in obj['fields']['permissions']]))
+        groups[group.name] = group
+    return groups
+
+
+def seed_dataset(scale=PERF_SCALE):
+    """Пользователи трёх ролей и по несколько страниц клиентов, сообщений, рассылок, попыток и записей блога"""
+    now = timezone.now()
+    groups = load_groups()
+    # Пароли не нужны: в тестах пользователи входят через force_login
+    superuser = User.objects.create(email='admin@example.com', is_staff=True, is_superuser=True)
+    moderator = User.objects.create(email='moderator@example.com')
+    moderator.groups.add(groups['moderators'])
+    owner = User.objects.create(email='owner@example.com')
+    other = User.objects.create(email='other@example.com', token='perf-token')
+
+    clients = Client.objects.bulk_create(
+        Client(email=f'client{i}@example{i % 5}.com', first_name=f'Имя{i % 20}', last_name=f'Фамилия{i}',
+               patronymic='Отчество', description=f'Клиент номер {i}', owner=owner if i % 4 else other)
+        for i in range(200 * scale)
+    )
+    messages = MailingMessage.objects.bulk_create(
+        MailingMessage(subject=f'Новости {i}', message='Здравствуйте, {{ first_name }}!\n' * 20,
+                       owner=owner if i % 4 else other)
+        for i in range(60 * scale)
+    )
+    segments = Segment.objects.bulk_create(
+        Segment(name=f'Сегмент {i}', email_domain=f'example{i % 5}.com', owner=owner if i % 4 else other)
+        for i in range(30 * scale)
+    )
+    mailings = MailingSettings.objects.bulk_create(
+        MailingSettings(start_datetime=now - timedelta(days=30), end_datetime=now + timedelta(days=30),
+                        period='per_day', status='started', mail_message=message, owner=message.owner,
+                        next_run_at=now + timedelta(days=1))
+        for message in messages
+    )
+    MailingSettings.clients.through.objects.bulk_create(
+        MailingSettings.clients.through(mailingsettings_id=mailing.pk, client_id=client.pk)
+        for i, mailing in enumerate(mailings) for client in clients[i % 10::20]
+    )
+    MailingSettings.segments.through.objects.bulk_create(
+        MailingSettings.segments.through(mailingsettings_id=mailing.pk, segment_id=segments[i % len(segments)].pk)
+        for i, mailing in enumerate(mailings)
+    )
+
+    attempts = Attempt.objects.bulk_create(
+        Attempt(mailing_settings=mailing, last_attempt_datetime=now - timedelta(days=day, hours=1),
+                status=True, total_count=10, success_count=8, failure_count=2)
+        for mailing in mailings for day in range(3)
+    )
+    Delivery.objects.bulk_create(
+        Delivery(email=f'client{i}@example.com', is_success=i % 5 != 0, smtp_code=250 if i % 5 else 550,
+                 server_response=None if i % 5 else 'Mailbox unavailable',
+                 created_at=attempt.last_attempt_datetime + timedelta(seconds=i),
+                 attempt=attempt, mailing_settings_id=attempt.mailing_settings_id)
+        for attempt in attempts for i in range(10)
+    )
+    DeliveryStat.objects.bulk_create(
+        DeliveryStat(hour=attempt.last_attempt_datetime.replace(minute=0, second=0, microsecond=0),
+                     sent_count=10, success_count=8, failure_count=2,
+                     mailing_settings_id=attempt.mailing_settings_id, owner=attempt.mailing_settings.owner)
+        for attempt in attempts
+    )
+
+    posts = BlogPost.objects.bulk_create(
+        BlogPost(title=f'Запись {i}', body='Текст записи о рассылках. ' * 50, count_views=i)
+        for i in range(20 * scale)
+    )
+    reconcile_counters()
+
+    return SimpleNamespace(
+        superuser=superuser, moderator=moderator, owner=owner, other=other,
+        client=clients[1], message=messages[1], segment=segments[1], mailing=mailings[1], attempt=attempts[3],
+        post=posts[0],
+    )
+
+
+class PageBudgetMixin:
+    """
+    Примесь к TestCase.
+    Открывает каждую страницу приложения от имени владельца, модератора и суперпользователя
+    и проверяет, что число запросов к базе не превышает бюджет страницы.
+
+    pages: {имя url: (функция data -> kwargs или None, бюджет запросов)}.
+    Каждый url из url_module обязан быть в pages, чтобы новые страницы не оставались без бюджета.
+    Запросы считаются на холодном кэше вместе с чтением сессии и пользователя,
+    время ответа снимается по PERF_REPEAT повторам.
+    """
+    url_module = None
+    pages = {}
+    roles = ('owner', 'moderator', 'superuser')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_dataset()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.report = {}
+        cls.baseline = {}
+        if PERF_BASELINE and os.path.exists(PERF_BASELINE):
+            with open(PERF_BASELINE) as baseline:
+                cls.baseline = json.load(baseline)
+
+    @classmethod
+    def tearDownClass(cls):
+        if PERF_OUTPUT and cls.report:
+            report = {}
+            if os.path.exists(PERF_OUTPUT):
+                with open(PERF_OUTPUT) as output:
+                    report = json.load(output)
+            report.update(cls.report)
+            with open(PERF_OUTPUT, 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2, sort_keys=True)
+        super().tearDownClass()
+
+    def test_every_url_has_budget(self):
+        if self.url_module is None:
+            return
+        namespace = self.url_module.app_name
+        names = {f'{namespace}:{pattern.name}' for pattern in self.url_module.urlpatterns}
+        self.assertEqual(names - set(self.pages), set(), 'Нет бюджета запросов для страниц')
+
+    def test_query_budgets(self):
+        for name, (get_kwargs, budget) in self.pages.items():
+            url = reverse(name, kwargs=get_kwargs(self.data) if get_kwargs else None)
+            for role in self.roles:
+                with self.subTest(url=name, role=role):
+                    self.check_page(name, url, role, budget)
+
+    def request(self, url):
+        response = self.client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def check_page(self, name, url, role, budget):
+        user = getattr(self.data, role)
+        self.client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(url)
+        self.assertLess(response.status_code, 500)
+        # captured_queries читает журнал соединения, который очищается в начале следующего запроса
+        captured_queries = queries.captured_queries
+
+        timings = []
+        for _ in range(PERF_REPEAT):
+            # Вход заново на случай, если страница завершила сессию
+            self.client.force_login(user)
+            started = time.perf_counter()
+            self.request(url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        result = {
+            'status': response.status_code,
+            'queries': len(captured_queries),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'max_ms': round(max(timings, default=0), 2),
+        }
+        self.report.setdefault(name, {})[role] = result
+
+        sql = '\n'.join(query['sql'] for query in captured_queries)
+        self.assertLessEqual(len(captured_queries), budget,
+                             f'{name} ({role}): {len(captured_queries)} запросов вместо {budget}\n{sql}')
+        baseline = self.baseline.get(name, {}).get(role)
+        if baseline:
+            limit = baseline['p50_ms'] * PERF_TOLERANCE + PERF_SLACK_MS
+            self.assertLessEqual(result['p50_ms'], limit, f'{name} ({role}): медиана {result["p50_ms"]} мс, '
+                                                          f'в базовом отчёте {baseline["p50_ms"]} мс')
@@ -19,8 +19,11 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from config.views import performance_stats
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('perf/', performance_stats, name='performance_stats'),
     path('', include('email_list.urls', namespace='email_list')),
     path('users/', include('users.urls', namespace='users')),
     path('blog/', include('blog.urls', namespace='blog')),
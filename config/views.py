@@ -0,0 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+
+from config.middleware import get_aggregates
+
+
+@staff_member_required
+def performance_stats(request):
+    """Сводка замеров PerformanceMiddleware по именам url, только для процесса, который ответил на запрос"""
+    return JsonResponse(get_aggregates(), json_dumps_params={'ensure_ascii': False, 'indent': 2})
@@ -1,27 +1,69 @@
 from django.contrib import admin
 
-from email_list.models import Client, MailingMessage, MailingSettings, Attempt
+from email_list.models import Client, MailingMessage, MailingSettings, Attempt, Delivery, OutboxMessage, Segment, \
+    BlockedWord, DeliveryStat
+from email_list.search import search
+
+
+class FullTextSearchMixin:
+    """Поиск в админке по полнотекстовому индексу вместо icontains по каждому полю"""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search(queryset, search_term), False
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'first_name', 'last_name', 'patronymic', 'email',)
     search_fields = ('first_name', 'last_name', 'patronymic', 'email',)
 
 
 @admin.register(MailingMessage)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'subject', 'message',)
     search_fields = ('subject', 'message',)
 
 
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'email_domain', 'last_name_prefix', 'owner',)
+    search_fields = ('name',)
+
+
 @admin.register(MailingSettings)
 class SettingsAdmin(admin.ModelAdmin):
-    list_display = ('id', 'period', 'start_datetime', 'end_datetime', 'is_active',)
+    list_display = ('id', 'period', 'start_datetime', 'end_datetime', 'next_run_at', 'is_active',)
     list_filter = ('is_active', 'period', 'start_datetime', 'end_datetime',)
 
 
 @admin.register(Attempt)
 class AttemptAdmin(admin.ModelAdmin):
-    list_display = ('id', 'status', 'last_attempt_datetime',)
+    list_display = ('id', 'status', 'last_attempt_datetime', 'total_count', 'success_count', 'failure_count',)
     list_filter = ('status', 'last_attempt_datetime',)
+
+
+@admin.register(Delivery)
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'email', 'is_success', 'smtp_code', 'created_at',)
+    list_filter = ('is_success',)
+    list_select_related = ('attempt',)
+
+
+@admin.register(DeliveryStat)
+class DeliveryStatAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mailing_settings', 'owner', 'hour', 'sent_count', 'success_count', 'failure_count',)
+    list_filter = ('hour',)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'email', 'subject', 'status', 'available_at', 'locked_by',)
+    list_filter = ('status',)
+
+
+@admin.register(BlockedWord)
+class BlockedWordAdmin(admin.ModelAdmin):
+    list_display = ('id', 'word',)
+    search_fields = ('word',)
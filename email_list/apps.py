@@ -8,6 +8,11 @@ class EmailListConfig(AppConfig):
     name = 'email_list'
 
     def ready(self):
-        if os.environ.get('RUN_MAIN'):
+        from django.conf import settings
+
+        import email_list.signals  # noqa: F401
+
+        # Отдельные обработчики запускаются командой run_dispatcher, встроенный планировщик можно отключить
+        if settings.MAILING_IN_PROCESS_SCHEDULER and os.environ.get('RUN_MAIN'):
             from email_list.services import start_scheduler
             start_scheduler()
@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from collections import Counter
+from itertools import batched
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from email_list.content_filter import get_content_filter
+from email_list.models import Client
+from email_list.services import increment_counter
+
+CLIENT_FIELDS = ('email', 'first_name', 'last_name', 'patronymic', 'description')
+FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(filename, default='csv'):
+    """Формат файла по расширению: .csv или .jsonl/.ndjson"""
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if filename.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_rows(stream, file_format):
+    """Построчно читает текстовый поток, не загружая файл в память целиком. Отдаёт (номер строки, словарь)"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = e
+            yield line_num, row
+
+
+def build_client(row, owner, content_filter=None):
+    """Клиент из строки файла, ValidationError если строка некорректна"""
+    if not isinstance(row, dict):
+        raise ValidationError(f'Строка не разобрана: {row}')
+    values = {}
+    for field in CLIENT_FIELDS:
+        value = str(row.get(field) or '').strip()
+        values[field] = value or (None if Client._meta.get_field(field).null else '')
+    client = Client(owner=owner, **values)
+    # clean_fields не обращается к базе, уникальность почты проверяется пачкой при вставке
+    client.clean_fields(exclude=['owner'])
+    words = (content_filter or get_content_filter()).find(client.description)
+    if words:
+        raise ValidationError(f'Запрещенные слова в комментарии: {", ".join(words)}')
+    return client
+
+
+class ImportReport(Counter):
+    """Счётчики импорта: rows, created, duplicates, invalid, и первые ошибки с номерами строк"""
+
+    def __init__(self):
+        super().__init__()
+        self.errors = []
+
+    def add_error(self, line_num, error):
+        self['invalid'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            messages = error.messages if isinstance(error, ValidationError) else [str(error)]
+            self.errors.append(f'Строка {line_num}: {"; ".join(messages)}')
+
+
+def import_clients(stream, file_format, owner=None, batch_size=None, progress=None):
+    """
+    Потоковый импорт клиентов из CSV или JSONL.
+    Почты, которые уже есть в базе или повторяются в файле, пропускаются;
+    после каждой пачки вызывается progress(report).
+    """
+    batch_size = batch_size or settings.CLIENT_IMPORT_BATCH_SIZE
+    report = ImportReport()
+
+    for batch in batched(iter_rows(stream, file_format), batch_size):
+        # Фильтр берётся один раз на пачку, а не на каждую строку
+        content_filter = get_content_filter()
+        clients = {}
+        for line_num, row in batch:
+            report['rows'] += 1
+            try:
+                client = build_client(row, owner, content_filter)
+            except ValidationError as e:
+                report.add_error(line_num, e)
+                continue
+            if client.email in clients:
+                report['duplicates'] += 1
+                continue
+            clients[client.email] = client
+
+        with transaction.atomic():
+            existing = set(Client.objects.filter(email__in=clients).values_list('email', flat=True))
+            new_clients = [client for email, client in clients.items() if email not in existing]
+            # ignore_conflicts на случай параллельной вставки той же почты между проверкой и записью
+            Client.objects.bulk_create(new_clients, ignore_conflicts=True)
+            if new_clients:
+                increment_counter('clients', len(new_clients))
+
+        report['duplicates'] += len(existing)
+        report['created'] += len(new_clients)
+        if progress is not None:
+            progress(report)
+
+    return report
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export(queryset, file_format, batch_size=None):
+    """Построчная выгрузка клиентов в CSV или JSONL, клиенты читаются пачками по первичному ключу"""
+    batch_size = batch_size or settings.CLIENT_IMPORT_BATCH_SIZE
+    writer = csv.writer(Echo())
+    if file_format == 'csv':
+        yield writer.writerow(CLIENT_FIELDS)
+
+    queryset = queryset.order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', *CLIENT_FIELDS)[:batch_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        if file_format == 'csv':
+            yield ''.join(writer.writerow(row[1:]) for row in rows)
+        else:
+            yield ''.join(json.dumps(dict(zip(CLIENT_FIELDS, row[1:])), ensure_ascii=False) + '\n' for row in rows)
+
+
+def open_text(binary_file):
+    """Текстовая обёртка над загруженным файлом, BOM от Excel пропускается"""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
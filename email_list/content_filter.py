@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from email_list.models import BlockedWord
+
+# ё и латинские буквы, похожие на кириллические, приводятся к одному виду. Замена посимвольная,
+# поэтому позиции в нормализованном тексте совпадают с исходным
+NORMALIZATION = str.maketrans('ёaeopcxykmthb', 'еаеорсхукмтнв')
+
+
+def normalize(text):
+    return text.lower().translate(NORMALIZATION)
+
+
+def build_pattern(words):
+    """
+    Регулярное выражение по префиксному дереву слов: на каждой позиции проверяется не весь список,
+    а только ветка с подходящей первой буквой, поэтому скорость почти не зависит от размера списка.
+    Слово ищется с начала слова в тексте, окончание может быть любым: «казино» находит и «казиношный».
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_regex(node):
+        if '' in node:
+            # Найдено целое слово, более длинные продолжения не нужны
+            return ''
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+
+    return re.compile(rf'(?<!\w){to_regex(trie)}') if trie else None
+
+
+class ContentFilter:
+    def __init__(self, words):
+        self.words = sorted({normalize(word.strip()) for word in words if word.strip()})
+        self.pattern = build_pattern(self.words)
+
+    def find(self, text):
+        """Все запрещённые слова из текста без повторов, в порядке появления"""
+        if not text or self.pattern is None:
+            return []
+        normalized = normalize(text)
+        # lower() у отдельных символов меняет длину строки, тогда слова берутся из нормализованного текста
+        source = text if len(normalized) == len(text) else normalized
+        hits = {}
+        for match in self.pattern.finditer(normalized):
+            end = match.end()
+            while end < len(normalized) and normalized[end].isalnum():
+                end += 1
+            hits.setdefault(match.group(), source[match.start():end])
+        return list(hits.values())
+
+
+def load_words():
+    """Слова из таблицы BlockedWord и файла CONTENT_FILTER_WORDS_FILE (по одному в строке)"""
+    words = list(BlockedWord.objects.values_list('word', flat=True))
+    if settings.CONTENT_FILTER_WORDS_FILE:
+        with open(settings.CONTENT_FILTER_WORDS_FILE, encoding='utf-8') as words_file:
+            words.extend(line for line in words_file if not line.startswith('#'))
+    return words
+
+
+def get_words_version():
+    """
+    Версия списка слов по самой таблице, а не по ключу кэша, поэтому изменения видны всем процессам.
+    Число строк замечает удаление, наибольший id — удаление вместе с добавлением, updated_at — правку слова.
+    """
+    version = BlockedWord.objects.aggregate(count=Count('id'), last_id=Max('id'), updated_at=Max('updated_at'))
+    version = (version['count'], version['last_id'], version['updated_at'])
+    if settings.CONTENT_FILTER_WORDS_FILE:
+        return version, os.path.getmtime(settings.CONTENT_FILTER_WORDS_FILE)
+    return version, None
+
+
+_filter = None
+_filter_version = None
+_filter_checked_at = None
+_filter_lock = threading.Lock()
+
+
+def get_content_filter():
+    """
+    Собранный фильтр процесса, пересобирается только после изменения списка слов.
+    Версия списка проверяется запросом к базе не чаще раза в CONTENT_FILTER_CHECK_SECONDS,
+    поэтому изменения доходят до остальных процессов с такой задержкой.
+    """
+    global _filter, _filter_version, _filter_checked_at
+    now = time.monotonic()
+    if _filter is not None and now - _filter_checked_at < settings.CONTENT_FILTER_CHECK_SECONDS:
+        return _filter
+    with _filter_lock:
+        if _filter is None or now - _filter_checked_at >= settings.CONTENT_FILTER_CHECK_SECONDS:
+            version = get_words_version()
+            if _filter is None or version != _filter_version:
+                _filter = ContentFilter(load_words())
+                _filter_version = version
+            _filter_checked_at = now
+    return _filter
+
+
+def find_blocked_words(text):
+    return get_content_filter().find(text)
@@ -0,0 +1,226 @@
+import atexit
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from itertools import batched
+from queue import LifoQueue, Empty
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+
+
+class DeliveryResult(NamedTuple):
+    """Результат отправки письма одному получателю"""
+    email: str
+    is_success: bool
+    smtp_code: int | None = None
+    server_response: str | None = None
+    # Ошибка, которую повторная отправка не исправит: адрес, заголовки, нет получателей, ошибка протокола
+    is_permanent: bool = False
+
+    @property
+    def is_temporary(self):
+        """Временная ошибка (4xx или обрыв соединения без кода ответа), письмо имеет смысл отправить повторно"""
+        if self.is_success or self.is_permanent:
+            return False
+        return self.smtp_code is None or 400 <= self.smtp_code < 500
+
+
+class TokenBucket:
+    """Ограничение скорости «корзиной токенов»: rate писем в секунду, capacity писем подряд"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host):
+    """
+    Общий для процесса ограничитель скорости отправки на SMTP-сервер host, None если ограничения нет.
+    Процессы не согласуют скорость между собой, поэтому лимит делится поровну на EMAIL_RATE_WORKERS процессов.
+    """
+    if not settings.EMAIL_RATE_LIMIT:
+        return None
+    workers = max(settings.EMAIL_RATE_WORKERS, 1)
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = TokenBucket(settings.EMAIL_RATE_LIMIT / workers,
+                                               settings.EMAIL_RATE_BURST // workers)
+        return _rate_limiters[host]
+
+
+class PooledEmailBackend(EmailBackend):
+    """
+    SMTP-бэкенд для пула соединений.
+    Ошибка по одному письму не прерывает пачку: результат запоминается в самом письме,
+    а наружу пробрасываются только ошибки соединения.
+    """
+
+    def _send(self, email_message):
+        rate_limiter = get_rate_limiter(self.host)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        try:
+            sent = super()._send(email_message)
+        except smtplib.SMTPServerDisconnected:
+            raise
+        except smtplib.SMTPRecipientsRefused as e:
+            code, response = next(iter(e.recipients.values()))
+            email_message.delivery_result = _failure(email_message, code, response)
+            return False
+        except smtplib.SMTPResponseException as e:
+            email_message.delivery_result = _failure(email_message, e.smtp_code, e.smtp_error)
+            return False
+        except smtplib.SMTPException as e:
+            # Без кода ответа это ошибки протокола или настроек сервера, повтор их не исправит
+            email_message.delivery_result = _failure(email_message, None, e, is_permanent=True)
+            return False
+        except ValueError as e:
+            # Некорректный адрес (sanitize_address) или перевод строки в заголовке (BadHeaderError)
+            email_message.delivery_result = _failure(email_message, None, e, is_permanent=True)
+            return False
+
+        if sent:
+            email_message.delivery_result = DeliveryResult(email_message.to[0], True)
+        else:
+            email_message.delivery_result = _failure(email_message, None, 'Нет получателей', is_permanent=True)
+        return sent
+
+
+def _failure(email_message, code, response, is_permanent=False):
+    if isinstance(response, bytes):
+        response = response.decode(errors='replace')
+    return DeliveryResult(email_message.to[0] if email_message.to else '', False, code, str(response), is_permanent)
+
+
+class SMTPConnectionPool:
+    """
+    Пул долгоживущих SMTP-соединений.
+    Простаивающее соединение перед выдачей проверяется командой NOOP,
+    а после ошибки закрывается и при следующем запросе открывается заново.
+    """
+
+    def __init__(self, size=None, batch_size=None, keepalive=None):
+        self.size = size or settings.EMAIL_POOL_SIZE
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.keepalive = settings.EMAIL_KEEPALIVE_SECONDS if keepalive is None else keepalive
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        except (smtplib.SMTPException, OSError):
+            self._discard(connection)
+            connection = None
+            raise
+        finally:
+            if connection is not None:
+                self._idle.put((connection, time.monotonic()))
+            self._slots.release()
+
+    def send_messages(self, email_messages):
+        """Отправляет письма пачками по batch_size и возвращает результат по каждому получателю"""
+        results = []
+        for batch in batched(email_messages, self.batch_size):
+            results.extend(self._send_batch(batch))
+        return results
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except Empty:
+                return
+            self._discard(connection)
+
+    def _send_batch(self, batch):
+        pending = list(batch)
+        error = None
+        # При обрыве соединения недоотправленные письма один раз досылаются через новое соединение
+        for _ in range(2):
+            try:
+                with self.connection() as connection:
+                    connection.send_messages(pending)
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+                pending = [message for message in pending if not hasattr(message, 'delivery_result')]
+                continue
+            break
+
+        return [
+            getattr(message, 'delivery_result', None) or _failure(message, getattr(error, 'smtp_code', None), error)
+            for message in batch
+        ]
+
+    def _checkout(self):
+        try:
+            connection, last_used = self._idle.get_nowait()
+        except Empty:
+            connection = PooledEmailBackend(fail_silently=False)
+            connection.open()
+            return connection
+
+        if connection.connection is None:
+            connection.open()
+        elif time.monotonic() - last_used > self.keepalive and not self._is_alive(connection):
+            self._discard(connection)
+            connection.open()
+        return connection
+
+    @staticmethod
+    def _is_alive(connection):
+        try:
+            code, _ = connection.connection.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        return code == 250
+
+    @staticmethod
+    def _discard(connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except (smtplib.SMTPException, OSError):
+            connection.connection = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """Общий для процесса пул SMTP-соединений"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool()
+            atexit.register(_pool.close)
+        return _pool
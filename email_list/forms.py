@@ -1,8 +1,32 @@
 from django import forms
 
-from email_list.models import Client, MailingMessage, MailingSettings, Attempt
+from email_list.client_io import CLIENT_FIELDS
+from email_list.content_filter import find_blocked_words
+from email_list.models import Client, MailingMessage, MailingSettings, Attempt, Segment
 
-word_blacklist = ("казино", "криптовалюта", "крипта", "биржа", "дешево", "бесплатно", "обман", "полиция", "радар")
+
+def check_blocked_words(text, where):
+    """Проверяет текст на запрещённые слова и сообщает обо всех найденных сразу"""
+    words = find_blocked_words(text)
+    if words:
+        raise forms.ValidationError(
+            f"Вы используете запрещенные слова {', '.join(f"'{word}'" for word in words)} {where}")
+
+
+class ClientSearchWidget(forms.SelectMultiple):
+    """
+    Выбор получателей с поиском на сервере.
+    В HTML попадают только уже выбранные клиенты, остальные подгружаются по мере ввода из email_list:client_search.
+    """
+    template_name = 'email_list/widgets/client_search.html'
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [pk for pk in value if str(pk).isdigit()]
+        clients = self.choices.queryset.filter(pk__in=selected) if selected else []
+        return [
+            (None, [self.create_option(name, client.pk, str(client), True, index, attrs=attrs)], index)
+            for index, client in enumerate(clients)
+        ]
 
 
 class StyleFormMixin:
@@ -23,9 +47,20 @@ class ClientForm(StyleFormMixin, forms.ModelForm):
     def clean_description(self):
         cleaned_data = self.cleaned_data['description']
 
-        for word in word_blacklist:
-            if word in cleaned_data.lower():
-                raise forms.ValidationError(f"Вы используете запрещенное слово '{word}' в описании клиента")
+        check_blocked_words(cleaned_data, 'в описании клиента')
+
+        return cleaned_data
+
+
+class ClientImportForm(StyleFormMixin, forms.Form):
+    file = forms.FileField(label='Файл CSV или JSONL',
+                           help_text=f'Колонки: {", ".join(CLIENT_FIELDS)}. Клиенты с уже известной почтой пропускаются')
+
+    def clean_file(self):
+        cleaned_data = self.cleaned_data['file']
+
+        if not cleaned_data.name.endswith(('.csv', '.jsonl', '.ndjson')):
+            raise forms.ValidationError('Поддерживаются только файлы .csv и .jsonl')
 
         return cleaned_data
 
@@ -38,18 +73,14 @@ class MailingMessageForm(StyleFormMixin, forms.ModelForm):
     def clean_subject(self):
         cleaned_data = self.cleaned_data['subject']
 
-        for word in word_blacklist:
-            if word in cleaned_data.lower():
-                raise forms.ValidationError(f"Вы используете запрещенное слово '{word}' в теме письма")
+        check_blocked_words(cleaned_data, 'в теме письма')
 
         return cleaned_data
 
     def clean_message(self):
         cleaned_data = self.cleaned_data['message']
 
-        for word in word_blacklist:
-            if word in cleaned_data.lower():
-                raise forms.ValidationError(f"Вы используете запрещенное слово '{word}' в сообщении")
+        check_blocked_words(cleaned_data, 'в сообщении')
 
         return cleaned_data
 
@@ -59,12 +90,36 @@ class MailingSettingsForm(StyleFormMixin, forms.ModelForm):
     class Meta:
         model = MailingSettings
         exclude = ('owner', 'status', 'is_active')
+        widgets = {'clients': ClientSearchWidget}
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         self.fields['mail_message'].queryset = MailingMessage.objects.filter(owner=user)
         self.fields['clients'].queryset = Client.objects.filter(owner=user)
+        self.fields['segments'].queryset = Segment.objects.filter(owner=user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        if not cleaned_data.get('clients') and not cleaned_data.get('segments'):
+            raise forms.ValidationError('Выберите получателей или хотя бы один сегмент')
+
+        return cleaned_data
+
+
+class SegmentForm(StyleFormMixin, forms.ModelForm):
+    class Meta:
+        model = Segment
+        exclude = ('owner',)
+
+    def clean_email_domain(self):
+        cleaned_data = self.cleaned_data['email_domain']
+
+        if cleaned_data:
+            cleaned_data = cleaned_data.strip().lstrip('@').lower()
+
+        return cleaned_data
 
 
 class MailingSettingsModeratorsForm(StyleFormMixin, forms.ModelForm):
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from email_list.client_io import FORMATS, detect_format, iter_export
+from email_list.models import Client
+
+
+class Command(BaseCommand):
+    """Выгрузка клиентов в CSV или JSONL"""
+    help = 'Потоково выгружает клиентов в файл или stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Путь к файлу, по умолчанию stdout')
+        parser.add_argument('--format', choices=FORMATS, default=None, help='По умолчанию по расширению файла')
+        parser.add_argument('--owner', default=None, help='Выгрузить только клиентов этого пользователя (почта)')
+
+    def handle(self, *args, **options):
+        queryset = Client.objects.all()
+        if options['owner']:
+            queryset = queryset.filter(owner__email=options['owner'])
+
+        file_format = options['format'] or detect_format(options['path'])
+        if options['path'] == '-':
+            self.write_export(sys.stdout, queryset, file_format)
+            return
+        try:
+            with open(options['path'], 'w', encoding='utf-8', newline='') as output:
+                self.write_export(output, queryset, file_format)
+        except OSError as e:
+            raise CommandError(e)
+
+    @staticmethod
+    def write_export(output, queryset, file_format):
+        for chunk in iter_export(queryset, file_format):
+            output.write(chunk)
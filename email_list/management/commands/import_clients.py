@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from email_list.client_io import FORMATS, detect_format, import_clients
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Массовая загрузка клиентов из CSV или JSONL"""
+    help = 'Потоково импортирует клиентов из файла, повторяющиеся почты пропускаются'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу, «-» для чтения из stdin')
+        parser.add_argument('--format', choices=FORMATS, default=None, help='По умолчанию по расширению файла')
+        parser.add_argument('--owner', default=None, help='Почта пользователя, которому принадлежат клиенты')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            owner = User.objects.filter(email=options['owner']).first()
+            if owner is None:
+                raise CommandError(f'Пользователь {options["owner"]} не найден')
+
+        file_format = options['format'] or detect_format(options['path'])
+        if options['path'] == '-':
+            report = self.run_import(sys.stdin, file_format, owner, options['batch_size'])
+        else:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = self.run_import(stream, file_format, owner, options['batch_size'])
+
+        for error in report.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(self.format_report(report)))
+
+    def run_import(self, stream, file_format, owner, batch_size):
+        return import_clients(stream, file_format, owner, batch_size,
+                              progress=lambda report: self.stdout.write(self.format_report(report)))
+
+    @staticmethod
+    def format_report(report):
+        return (f'Обработано строк: {report["rows"]}, добавлено: {report["created"]}, '
+                f'дубликатов: {report["duplicates"]}, с ошибками: {report["invalid"]}')
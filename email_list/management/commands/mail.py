@@ -1,9 +1,55 @@
+import signal
+import time
+
 from django.core.management import BaseCommand
+from django.db import connections
 
-from email_list.services import start_scheduler
+from email_list.partitions import PARTITIONS_CHECK_INTERVAL, ensure_partitions
+from email_list.services import get_worker_id, process_outbox, send_newsletter_periodic_email
 
 
 class Command(BaseCommand):
     """Команда на запуск рассылки"""
+    help = 'Обработчик очереди писем: отправляет письма пачками до остановки по SIGTERM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Размер пачки писем')
+        parser.add_argument('--idle-sleep', type=float, default=5, help='Пауза при пустой очереди, секунд')
+        parser.add_argument('--with-scheduler', action='store_true',
+                            help='Заодно раз в минуту ставить в очередь подошедшие рассылки')
+
     def handle(self, *args, **options):
-        start_scheduler()
+        worker_id = get_worker_id()
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f'Обработчик очереди {worker_id} запущен')
+        next_tick = time.monotonic()
+        next_partitions_check = time.monotonic()
+        while self.running:
+            try:
+                # Секции журнала доставок на следующие месяцы, раз в сутки и при запуске
+                if time.monotonic() >= next_partitions_check:
+                    ensure_partitions()
+                    next_partitions_check = time.monotonic() + PARTITIONS_CHECK_INTERVAL
+
+                if options['with_scheduler'] and time.monotonic() >= next_tick:
+                    next_tick = time.monotonic() + 60
+                    send_newsletter_periodic_email(worker_id)
+
+                # Текущая пачка всегда дорабатывается до конца, остановка проверяется между пачками
+                if process_outbox(worker_id, options['batch_size']):
+                    continue
+            except Exception as e:
+                # Ошибка не останавливает обработчик, после паузы он продолжит работу
+                self.stderr.write(f'Ошибка обработчика очереди {worker_id}: {e}')
+                connections.close_all()
+
+            idle_until = time.monotonic() + options['idle_sleep']
+            while self.running and time.monotonic() < idle_until:
+                time.sleep(0.5)
+        self.stdout.write(f'Обработчик очереди {worker_id} остановлен')
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from email_list.partitions import archive_partition, drop_partition, ensure_partitions, get_expired_partitions, \
+    count_expired_default_rows, prune_default_partition, DEFAULT_PARTITION
+
+
+class Command(BaseCommand):
+    """Выгрузка в архив и удаление журнала доставок старше срока хранения: секций и строк секции по умолчанию"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=settings.DELIVERY_RETENTION_MONTHS,
+                            help='Сколько месяцев журнала хранить, считая текущий')
+        parser.add_argument('--archive-dir', default=settings.DELIVERY_ARCHIVE_DIR,
+                            help='Каталог для архивов секций')
+        parser.add_argument('--no-archive', action='store_true', help='Удалить секции без выгрузки')
+        parser.add_argument('--detach-only', action='store_true',
+                            help='Только отсоединить секции от журнала, таблицы оставить')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, какие секции будут удалены')
+
+    def handle(self, *args, **options):
+        ensure_partitions()
+        keep_months = max(options['keep_months'], 1)
+
+        # Строки, попавшие в секцию по умолчанию, удаляются по тому же сроку хранения
+        if options['dry_run']:
+            expired_rows = count_expired_default_rows(keep_months)
+            if expired_rows:
+                self.stdout.write(f'{DEFAULT_PARTITION}: будет удалено строк: {expired_rows}')
+        else:
+            deleted, path = prune_default_partition(keep_months,
+                                                    None if options['no_archive'] else options['archive_dir'])
+            if deleted:
+                self.stdout.write(f'{DEFAULT_PARTITION}: удалено строк: {deleted}'
+                                  + (f', выгружены в {path}' if path else ''))
+
+        expired = get_expired_partitions(keep_months)
+        if not expired:
+            self.stdout.write('Устаревших секций нет')
+            return
+
+        for month, name in expired:
+            if options['dry_run']:
+                self.stdout.write(f'{name}: будет удалена')
+                continue
+            if not options['no_archive']:
+                path = archive_partition(name, options['archive_dir'])
+                self.stdout.write(f'{name}: выгружена в {path}')
+            drop_partition(name, detach_only=options['detach_only'])
+            self.stdout.write(f'{name}: {"отсоединена" if options["detach_only"] else "удалена"}')
@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from email_list.services import reconcile_counters
+
+
+class Command(BaseCommand):
+    """Пересчёт счётчиков главной страницы"""
+
+    def handle(self, *args, **options):
+        for name, value in reconcile_counters().items():
+            self.stdout.write(f'{name}: {value}')
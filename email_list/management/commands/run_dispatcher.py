@@ -0,0 +1,49 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+
+from email_list.partitions import PARTITIONS_CHECK_INTERVAL, ensure_partitions
+from email_list.services import get_worker_id, send_newsletter_periodic_email
+
+
+class Command(BaseCommand):
+    """Обработчик рассылок. Можно запускать в нескольких экземплярах на одном или нескольких серверах"""
+    help = 'Периодически захватывает и отправляет подошедшие рассылки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=60, help='Пауза между проверками, секунд')
+        parser.add_argument('--worker-id', default=None, help='Имя обработчика, по умолчанию хост:pid')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or get_worker_id()
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f'Обработчик {worker_id} запущен')
+        next_partitions_check = time.monotonic()
+        while self.running:
+            started = time.monotonic()
+            try:
+                # Секции журнала доставок на следующие месяцы, раз в сутки и при запуске
+                if started >= next_partitions_check:
+                    ensure_partitions()
+                    next_partitions_check = started + PARTITIONS_CHECK_INTERVAL
+                claimed = send_newsletter_periodic_email(worker_id)
+            except Exception as e:
+                # Ошибка одной проверки не останавливает обработчик: следующая попытка через interval
+                self.stderr.write(f'Ошибка обработчика {worker_id}: {e}')
+                connections.close_all()
+                claimed = 0
+            # Если захвачена полная пачка, подошедшие рассылки могли остаться, проверяем сразу
+            if claimed >= settings.MAILING_CLAIM_BATCH_SIZE:
+                continue
+            while self.running and time.monotonic() - started < options['interval']:
+                time.sleep(1)
+        self.stdout.write(f'Обработчик {worker_id} остановлен')
+
+    def stop(self, signum, frame):
+        self.running = False
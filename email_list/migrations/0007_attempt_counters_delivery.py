@@ -0,0 +1,46 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0006_alter_attempt_last_attempt_datetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='failure_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Не доставлено'),
+        ),
+        migrations.AddField(
+            model_name='attempt',
+            name='success_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Доставлено'),
+        ),
+        migrations.AddField(
+            model_name='attempt',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего писем'),
+        ),
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, verbose_name='Получатель')),
+                ('is_success', models.BooleanField(verbose_name='Успешно')),
+                ('smtp_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Код ответа SMTP')),
+                ('server_response', models.TextField(blank=True, null=True, verbose_name='Ответ почтового сервера')),
+                ('created_at', models.DateTimeField(verbose_name='Дата и время отправки')),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='email_list.attempt', verbose_name='Попытка рассылки')),
+                ('mailing_settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='email_list.mailingsettings', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Доставка письма',
+                'verbose_name_plural': 'Доставки писем',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:15
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+PERIOD_DELTAS = {'per_day': timedelta(days=1), 'per_week': timedelta(weeks=1), 'per_month': timedelta(weeks=4)}
+
+
+def fill_next_run_at(apps, schema_editor):
+    MailingSettings = apps.get_model('email_list', 'MailingSettings')
+    Attempt = apps.get_model('email_list', 'Attempt')
+
+    for mailing in MailingSettings.objects.filter(is_active=True):
+        last_run_at = Attempt.objects.filter(mailing_settings=mailing).order_by('-last_attempt_datetime').values_list(
+            'last_attempt_datetime', flat=True).first()
+        if last_run_at is None:
+            next_run_at = mailing.start_datetime
+        else:
+            next_run_at = max(last_run_at + PERIOD_DELTAS.get(mailing.period, PERIOD_DELTAS['per_month']),
+                              mailing.start_datetime)
+        mailing.next_run_at = min(next_run_at, mailing.end_datetime)
+        mailing.save(update_fields=['next_run_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0007_attempt_counters_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingsettings',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Следующий запуск'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingsettings',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_run_at'], name='mailing_due_idx'),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0008_mailingsettings_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingsettings',
+            name='claimed_by',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, verbose_name='Захвачена обработчиком'),
+        ),
+        migrations.AddField(
+            model_name='mailingsettings',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Захвачена до'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0009_mailingsettings_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, verbose_name='Получатель')),
+                ('from_email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Отправитель')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема письма')),
+                ('body', models.TextField(blank=True, null=True, verbose_name='Текст письма')),
+                ('status', models.CharField(choices=[('pending', 'ожидает отправки'), ('sending', 'отправляется'), ('failed', 'не доставлено')], default='pending', max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Поставлено в очередь')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправить не раньше')),
+                ('locked_by', models.CharField(blank=True, max_length=100, null=True, verbose_name='Захвачено обработчиком')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Захвачено до')),
+                ('attempt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='email_list.attempt', verbose_name='Попытка рассылки')),
+            ],
+            options={
+                'verbose_name': 'Письмо в очереди',
+                'verbose_name_plural': 'Очередь писем',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['available_at'], name='outbox_pending_idx'), models.Index(condition=models.Q(('status', 'sending')), fields=['locked_until'], name='outbox_sending_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='outboxmessage',
+            constraint=models.UniqueConstraint(fields=('attempt', 'email'), name='outbox_unique_recipient'),
+        ),
+    ]
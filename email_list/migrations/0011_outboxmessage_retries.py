@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0010_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='last_error',
+            field=models.TextField(blank=True, null=True, verbose_name='Последняя ошибка'),
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='retries',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Повторных попыток'),
+        ),
+    ]
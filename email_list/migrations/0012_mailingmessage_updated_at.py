@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0011_outboxmessage_retries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingmessage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AlterField(
+            model_name='mailingmessage',
+            name='message',
+            field=models.TextField(blank=True, help_text='Можно использовать подстановки {{ first_name }}, {{ last_name }}, {{ patronymic }}, {{ email }}', null=True, verbose_name='Сообщение'),
+        ),
+        migrations.AlterField(
+            model_name='mailingmessage',
+            name='subject',
+            field=models.CharField(help_text='Можно использовать подстановки {{ first_name }}, {{ last_name }}, {{ patronymic }}, {{ email }}', max_length=100, verbose_name='Тема письма'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0012_mailingmessage_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['mailing_settings', '-last_attempt_datetime'], name='attempt_latest_idx'),
+        ),
+    ]
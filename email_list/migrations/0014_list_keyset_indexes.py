@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0013_attempt_latest_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', 'id'], name='client_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', 'email'], name='client_owner_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', 'last_name', 'id'], name='client_owner_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingmessage',
+            index=models.Index(fields=['owner', 'id'], name='message_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingmessage',
+            index=models.Index(fields=['owner', 'subject', 'id'], name='message_owner_subject_idx'),
+        ),
+    ]
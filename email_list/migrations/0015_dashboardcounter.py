@@ -0,0 +1,38 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    DashboardCounter = apps.get_model('email_list', 'DashboardCounter')
+    MailingSettings = apps.get_model('email_list', 'MailingSettings')
+    Client = apps.get_model('email_list', 'Client')
+
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(name='mailings', value=MailingSettings.objects.count()),
+        DashboardCounter(name='active_mailings', value=MailingSettings.objects.filter(is_active=True).count()),
+        DashboardCounter(name='clients', value=Client.objects.count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0014_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Счётчик')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик главной страницы',
+                'verbose_name_plural': 'Счётчики главной страницы',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
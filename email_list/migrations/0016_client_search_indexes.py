@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:33
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0015_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(models.F('owner'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='text_pattern_ops'), name='client_owner_email_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(models.F('owner'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='text_pattern_ops'), name='client_owner_lname_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('email_list', '0016_client_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailingsettings',
+            name='clients',
+            field=models.ManyToManyField(blank=True, to='email_list.client', verbose_name='Получатели'),
+        ),
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150, verbose_name='Название')),
+                ('email_domain', models.CharField(blank=True, help_text='Например, example.com', max_length=100, null=True, verbose_name='Домен почты')),
+                ('first_name', models.CharField(blank=True, max_length=20, null=True, verbose_name='Имя')),
+                ('last_name_prefix', models.CharField(blank=True, max_length=30, null=True, verbose_name='Фамилия начинается с')),
+                ('patronymic', models.CharField(blank=True, max_length=30, null=True, verbose_name='Отчество')),
+                ('description_contains', models.CharField(blank=True, max_length=100, null=True, verbose_name='Комментарий содержит')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Владелец сегмента')),
+            ],
+            options={
+                'verbose_name': 'сегмент',
+                'verbose_name_plural': 'сегменты',
+            },
+        ),
+        migrations.AddField(
+            model_name='mailingsettings',
+            name='segments',
+            field=models.ManyToManyField(blank=True, to='email_list.segment', verbose_name='Сегменты'),
+        ),
+        migrations.AddIndex(
+            model_name='segment',
+            index=models.Index(fields=['owner', 'id'], name='segment_owner_id_idx'),
+        ),
+    ]
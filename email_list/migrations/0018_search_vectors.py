@@ -0,0 +1,78 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+CLIENT_TRIGGER = """
+CREATE FUNCTION email_list_client_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', concat_ws(' ', NEW.last_name, NEW.first_name, NEW.patronymic,
+                                                   NEW.email, replace(NEW.email, '@', ' '))), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER email_list_client_search_vector
+    BEFORE INSERT OR UPDATE OF email, first_name, last_name, patronymic, description ON email_list_client
+    FOR EACH ROW EXECUTE FUNCTION email_list_client_search_vector();
+
+UPDATE email_list_client SET email = email;
+"""
+
+MESSAGE_TRIGGER = """
+CREATE FUNCTION email_list_mailingmessage_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.subject, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.message, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER email_list_mailingmessage_search_vector
+    BEFORE INSERT OR UPDATE OF subject, message ON email_list_mailingmessage
+    FOR EACH ROW EXECUTE FUNCTION email_list_mailingmessage_search_vector();
+
+UPDATE email_list_mailingmessage SET subject = subject;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0017_segment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mailingmessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='client_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mailingmessage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ),
+        migrations.RunSQL(
+            CLIENT_TRIGGER,
+            reverse_sql='DROP TRIGGER email_list_client_search_vector ON email_list_client; '
+                        'DROP FUNCTION email_list_client_search_vector();',
+        ),
+        migrations.RunSQL(
+            MESSAGE_TRIGGER,
+            reverse_sql='DROP TRIGGER email_list_mailingmessage_search_vector ON email_list_mailingmessage; '
+                        'DROP FUNCTION email_list_mailingmessage_search_vector();',
+        ),
+    ]
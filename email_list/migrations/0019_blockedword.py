@@ -0,0 +1,33 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+# Слова, которые раньше были зашиты в email_list/forms.py
+INITIAL_WORDS = ("казино", "криптовалюта", "крипта", "биржа", "дешево", "бесплатно", "обман", "полиция", "радар")
+
+
+def add_initial_words(apps, schema_editor):
+    BlockedWord = apps.get_model('email_list', 'BlockedWord')
+    BlockedWord.objects.bulk_create([BlockedWord(word=word) for word in INITIAL_WORDS], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0018_search_vectors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=100, unique=True, verbose_name='Слово')),
+            ],
+            options={
+                'verbose_name': 'Запрещённое слово',
+                'verbose_name_plural': 'Запрещённые слова',
+            },
+        ),
+        migrations.RunPython(add_initial_words, migrations.RunPython.noop),
+    ]
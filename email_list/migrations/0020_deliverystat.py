@@ -0,0 +1,54 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+from django.db.models.functions import TruncHour
+
+
+def fill_delivery_stats(apps, schema_editor):
+    Delivery = apps.get_model('email_list', 'Delivery')
+    DeliveryStat = apps.get_model('email_list', 'DeliveryStat')
+    rows = Delivery.objects.annotate(hour=TruncHour('created_at')).values(
+        'mailing_settings_id', 'mailing_settings__owner_id', 'hour',
+    ).annotate(sent=Count('id'), success=Count('id', filter=Q(is_success=True))).order_by()
+    DeliveryStat.objects.bulk_create([
+        DeliveryStat(mailing_settings_id=row['mailing_settings_id'], owner_id=row['mailing_settings__owner_id'],
+                     hour=row['hour'], sent_count=row['sent'], success_count=row['success'],
+                     failure_count=row['sent'] - row['success'])
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('email_list', '0019_blockedword'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Отправлено')),
+                ('success_count', models.PositiveIntegerField(default=0, verbose_name='Доставлено')),
+                ('failure_count', models.PositiveIntegerField(default=0, verbose_name='Не доставлено')),
+                ('mailing_settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='email_list.mailingsettings', verbose_name='Рассылка')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Владелец рассылки')),
+            ],
+            options={
+                'verbose_name': 'Статистика доставки',
+                'verbose_name_plural': 'Статистика доставки',
+                'indexes': [models.Index(fields=['owner', 'hour'], name='deliverystat_owner_hour_idx'), models.Index(fields=['hour'], name='deliverystat_hour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deliverystat',
+            constraint=models.UniqueConstraint(fields=('mailing_settings', 'hour'), name='deliverystat_mailing_hour_uniq'),
+        ),
+        migrations.RunPython(fill_delivery_stats, migrations.RunPython.noop),
+    ]
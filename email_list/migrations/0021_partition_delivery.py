@@ -0,0 +1,89 @@
+from datetime import date
+
+from django.db import migrations
+
+# Секции создаются на все месяцы с уже записанными доставками и на несколько месяцев вперёд,
+# дальше их поддерживает email_list.partitions.ensure_partitions
+MONTHS_AHEAD = 3
+
+INDEXES_SQL = [
+    'CREATE INDEX email_list_delivery_attempt_id_e1b13afd ON email_list_delivery (attempt_id)',
+    'CREATE INDEX email_list_delivery_mailing_settings_id_5005a5b8 ON email_list_delivery (mailing_settings_id)',
+    'ALTER TABLE email_list_delivery ADD CONSTRAINT email_list_delivery_attempt_id_e1b13afd_fk_email_lis '
+    'FOREIGN KEY (attempt_id) REFERENCES email_list_attempt (id) DEFERRABLE INITIALLY DEFERRED',
+    'ALTER TABLE email_list_delivery ADD CONSTRAINT email_list_delivery_mailing_settings_id_5005a5b8_fk_email_lis '
+    'FOREIGN KEY (mailing_settings_id) REFERENCES email_list_mailingsettings (id) DEFERRABLE INITIALLY DEFERRED',
+]
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_delivery(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    execute('ALTER TABLE email_list_delivery RENAME TO email_list_delivery_old')
+    execute('ALTER TABLE email_list_delivery_old RENAME CONSTRAINT email_list_delivery_pkey '
+            'TO email_list_delivery_old_pkey')
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования
+    execute('CREATE TABLE email_list_delivery (LIKE email_list_delivery_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS, '
+            'PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)')
+    # Секция по умолчанию страхует запись, если планировщик не успел создать секцию на новый месяц
+    execute('CREATE TABLE email_list_delivery_default PARTITION OF email_list_delivery DEFAULT')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT date_trunc('month', MIN(created_at))::date FROM email_list_delivery_old")
+        first_month = cursor.fetchone()[0]
+    current_month = date.today().replace(day=1)
+    month = min(first_month or current_month, current_month)
+    while month <= add_months(current_month, MONTHS_AHEAD):
+        execute(f'CREATE TABLE email_list_delivery_y{month.year:04d}m{month.month:02d} '
+                f'PARTITION OF email_list_delivery FOR VALUES FROM (%s) TO (%s)',
+                [month.isoformat(), add_months(month, 1).isoformat()])
+        month = add_months(month, 1)
+
+    execute('INSERT INTO email_list_delivery SELECT * FROM email_list_delivery_old')
+    execute('DROP TABLE email_list_delivery_old')
+
+    # Столбцы идентификации не поддерживаются секционированными таблицами, id берётся из обычной последовательности
+    execute('CREATE SEQUENCE email_list_delivery_id_seq OWNED BY email_list_delivery.id')
+    execute("ALTER TABLE email_list_delivery ALTER COLUMN id SET DEFAULT nextval('email_list_delivery_id_seq')")
+    execute("SELECT setval('email_list_delivery_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM email_list_delivery")
+    for sql in INDEXES_SQL:
+        execute(sql)
+
+
+def unpartition_delivery(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    execute('ALTER TABLE email_list_delivery RENAME TO email_list_delivery_partitioned')
+    execute('ALTER TABLE email_list_delivery_partitioned RENAME CONSTRAINT email_list_delivery_pkey '
+            'TO email_list_delivery_partitioned_pkey')
+    execute('CREATE TABLE email_list_delivery (LIKE email_list_delivery_partitioned INCLUDING CONSTRAINTS, '
+            'PRIMARY KEY (id))')
+    execute('INSERT INTO email_list_delivery SELECT * FROM email_list_delivery_partitioned')
+    # Вместе с таблицей удаляются все секции и последовательность id
+    execute('DROP TABLE email_list_delivery_partitioned')
+
+    execute('ALTER TABLE email_list_delivery ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute("SELECT setval(pg_get_serial_sequence('email_list_delivery', 'id'), COALESCE(MAX(id), 0) + 1, false) "
+            "FROM email_list_delivery")
+    for sql in INDEXES_SQL:
+        execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0020_deliverystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_delivery, unpartition_delivery),
+    ]
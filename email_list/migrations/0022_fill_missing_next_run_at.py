@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.db import migrations
+
+PERIOD_DELTAS = {'per_day': timedelta(days=1), 'per_week': timedelta(weeks=1), 'per_month': timedelta(weeks=4)}
+
+
+def fill_missing_next_run_at(apps, schema_editor):
+    # Рассылки, загруженные через loaddata до пересчёта расписания в pre_save, остались без next_run_at
+    MailingSettings = apps.get_model('email_list', 'MailingSettings')
+    Attempt = apps.get_model('email_list', 'Attempt')
+
+    for mailing in MailingSettings.objects.filter(is_active=True, next_run_at__isnull=True):
+        last_run_at = Attempt.objects.filter(mailing_settings=mailing).order_by('-last_attempt_datetime').values_list(
+            'last_attempt_datetime', flat=True).first()
+        if last_run_at is None:
+            next_run_at = mailing.start_datetime
+        else:
+            next_run_at = max(last_run_at + PERIOD_DELTAS.get(mailing.period, PERIOD_DELTAS['per_month']),
+                              mailing.start_datetime)
+        mailing.next_run_at = min(next_run_at, mailing.end_datetime)
+        mailing.save(update_fields=['next_run_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0021_partition_delivery'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_list', '0022_fill_missing_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockedword',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменено'),
+        ),
+    ]
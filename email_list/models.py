@@ -1,11 +1,19 @@
 from datetime import datetime, timedelta
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.utils import timezone
 
+from email_list.personalization import PLACEHOLDERS_HELP, MAX_SUBJECT_LENGTH
 from users.models import User
 
 NULLABLE = {'blank': True, 'null': True}
 
+PERIOD_DELTAS = {'per_day': timedelta(days=1), 'per_week': timedelta(weeks=1), 'per_month': timedelta(weeks=4)}
+
 
 class Client(models.Model):
     email = models.EmailField(unique=True, verbose_name='Почта')
@@ -13,6 +21,8 @@ class Client(models.Model):
     last_name = models.CharField(max_length=30, verbose_name='Фамилия')
     patronymic = models.CharField(max_length=30, verbose_name='Отчество', **NULLABLE)
     description = models.TextField(verbose_name='Комментарий', **NULLABLE)
+    # Заполняется триггером в базе, см. миграцию 0018_search_vectors
+    search_vector = SearchVectorField(editable=False, **NULLABLE)
 
     owner = models.ForeignKey(User, on_delete=models.SET_NULL,
                               verbose_name='Владелец карточки клиента', **NULLABLE)
@@ -23,11 +33,24 @@ class Client(models.Model):
     class Meta:
         verbose_name = 'клиент'
         verbose_name_plural = 'клиенты'
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='client_owner_id_idx'),
+            models.Index(fields=['owner', 'email'], name='client_owner_email_idx'),
+            models.Index(fields=['owner', 'last_name', 'id'], name='client_owner_last_name_idx'),
+            # Поиск получателей по началу почты или фамилии: istartswith даёт UPPER(...) LIKE 'ЗАПРОС%'
+            models.Index(F('owner'), OpClass(Upper('email'), name='text_pattern_ops'),
+                         name='client_owner_email_prefix_idx'),
+            models.Index(F('owner'), OpClass(Upper('last_name'), name='text_pattern_ops'),
+                         name='client_owner_lname_prefix_idx'),
+            GinIndex(fields=['search_vector'], name='client_search_idx'),
+        ]
 
 
 class MailingMessage(models.Model):
-    subject = models.CharField(max_length=100, verbose_name='Тема письма')
-    message = models.TextField(verbose_name='Сообщение', **NULLABLE)
+    subject = models.CharField(max_length=100, verbose_name='Тема письма', help_text=PLACEHOLDERS_HELP)
+    message = models.TextField(verbose_name='Сообщение', help_text=PLACEHOLDERS_HELP, **NULLABLE)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+    search_vector = SearchVectorField(editable=False, **NULLABLE)
 
     owner = models.ForeignKey(User, on_delete=models.SET_NULL,
                               verbose_name='Владелец сообщения для рассылки', **NULLABLE)
@@ -38,6 +61,60 @@ class MailingMessage(models.Model):
     class Meta:
         verbose_name = 'Сообщение'
         verbose_name_plural = 'Сообщения'
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='message_owner_id_idx'),
+            models.Index(fields=['owner', 'subject', 'id'], name='message_owner_subject_idx'),
+            GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ]
+
+
+class Segment(models.Model):
+    """
+    Сохранённая выборка получателей. Хранятся только правила отбора,
+    клиенты подбираются по ним в момент отправки. Пустые правила — все клиенты владельца.
+    """
+    name = models.CharField(max_length=150, verbose_name='Название')
+    email_domain = models.CharField(max_length=100, verbose_name='Домен почты', help_text='Например, example.com',
+                                    **NULLABLE)
+    first_name = models.CharField(max_length=20, verbose_name='Имя', **NULLABLE)
+    last_name_prefix = models.CharField(max_length=30, verbose_name='Фамилия начинается с', **NULLABLE)
+    patronymic = models.CharField(max_length=30, verbose_name='Отчество', **NULLABLE)
+    description_contains = models.CharField(max_length=100, verbose_name='Комментарий содержит', **NULLABLE)
+
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, verbose_name='Владелец сегмента', **NULLABLE)
+
+    def __str__(self):
+        return self.name
+
+    def get_filter(self):
+        """Условие отбора клиентов сегмента, у сегмента без владельца клиентов нет"""
+        if self.owner_id is None:
+            # Q(owner_id=None) превратился бы в owner IS NULL и отобрал бы всех клиентов без владельца
+            return models.Q(pk__in=[])
+        condition = models.Q(owner_id=self.owner_id)
+        if self.email_domain:
+            condition &= models.Q(email__iendswith=f'@{self.email_domain.lstrip("@")}')
+        if self.first_name:
+            condition &= models.Q(first_name__iexact=self.first_name)
+        if self.last_name_prefix:
+            condition &= models.Q(last_name__istartswith=self.last_name_prefix)
+        if self.patronymic:
+            condition &= models.Q(patronymic__iexact=self.patronymic)
+        if self.description_contains:
+            condition &= models.Q(description__icontains=self.description_contains)
+        return condition
+
+    def get_clients(self):
+        if self.owner_id is None:
+            return Client.objects.none()
+        return Client.objects.filter(self.get_filter())
+
+    class Meta:
+        verbose_name = 'сегмент'
+        verbose_name_plural = 'сегменты'
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='segment_owner_id_idx'),
+        ]
 
 
 class MailingSettings(models.Model):
@@ -51,21 +128,52 @@ class MailingSettings(models.Model):
     status = models.CharField(max_length=15, choices=statuses, default='создана', verbose_name='Статус рассылки')
     is_active = models.BooleanField(default=True, verbose_name='Активна')
 
-    clients = models.ManyToManyField(Client, verbose_name='Получатели')
+    clients = models.ManyToManyField(Client, verbose_name='Получатели', blank=True)
+    segments = models.ManyToManyField(Segment, verbose_name='Сегменты', blank=True)
     mail_message = models.ForeignKey(MailingMessage, on_delete=models.CASCADE, verbose_name='Сообщение', **NULLABLE)
 
     owner = models.ForeignKey(User, on_delete=models.SET_NULL,
                               verbose_name='Владелец рассылки', **NULLABLE)
 
+    next_run_at = models.DateTimeField(editable=False, verbose_name='Следующий запуск', **NULLABLE)
+    claimed_by = models.CharField(max_length=100, editable=False, verbose_name='Захвачена обработчиком', **NULLABLE)
+    claimed_until = models.DateTimeField(editable=False, verbose_name='Захвачена до', **NULLABLE)
+
     def __str__(self):
         return f'{self.mail_message.subject}. {self.status}. {'Активна' if self.is_active else 'Не активна'}'
 
+    def calculate_next_run_at(self, last_run_at=None):
+        """Время следующего запуска по периоду рассылки, но не раньше начала и не позже окончания"""
+        if not self.is_active:
+            return None
+        if last_run_at is None:
+            next_run_at = self.start_datetime
+        else:
+            next_run_at = max(last_run_at + PERIOD_DELTAS.get(self.period, PERIOD_DELTAS['per_month']),
+                              self.start_datetime)
+        return min(next_run_at, self.end_datetime)
+
+    def get_recipients(self):
+        """
+        Клиенты, выбранные вручную, и клиенты сегментов рассылки без повторов.
+        Каждая выборка отдельным запросом в UNION: условия, соединённые через OR в одном WHERE,
+        не дают Postgres использовать индексы по владельцу, и он читает всю таблицу клиентов.
+        """
+        recipients = Client.objects.filter(pk__in=self.clients.through.objects.filter(
+            mailingsettings_id=self.pk).values('client_id')).order_by()
+        segment_recipients = [Client.objects.filter(segment.get_filter()).order_by()
+                              for segment in self.segments.all()]
+        return recipients.union(*segment_recipients) if segment_recipients else recipients
+
     class Meta:
         verbose_name = 'Рассылка'
         verbose_name_plural = 'Рассылки'
         permissions = [
             ('stop_mailing', 'Can stop mailing')
         ]
+        indexes = [
+            models.Index(fields=['next_run_at'], condition=models.Q(is_active=True), name='mailing_due_idx'),
+        ]
 
 
 class Attempt(models.Model):
@@ -79,9 +187,116 @@ class Attempt(models.Model):
 
     server_response = models.CharField(verbose_name='Ответ почтового сервера, если он был', **NULLABLE)
 
+    total_count = models.PositiveIntegerField(default=0, verbose_name='Всего писем')
+    success_count = models.PositiveIntegerField(default=0, verbose_name='Доставлено')
+    failure_count = models.PositiveIntegerField(default=0, verbose_name='Не доставлено')
+
     def __str__(self):
         return f'{self.mailing_settings.mail_message.subject}. {self.last_attempt_datetime} - {self.status}.'
 
     class Meta:
         verbose_name = 'Попытка рассылки'
         verbose_name_plural = 'Попытки рассылки'
+        indexes = [
+            models.Index(fields=['mailing_settings', '-last_attempt_datetime'], name='attempt_latest_idx'),
+        ]
+
+
+class Delivery(models.Model):
+    email = models.EmailField(verbose_name='Получатель')
+    is_success = models.BooleanField(verbose_name='Успешно')
+    smtp_code = models.PositiveSmallIntegerField(verbose_name='Код ответа SMTP', **NULLABLE)
+    server_response = models.TextField(verbose_name='Ответ почтового сервера', **NULLABLE)
+    created_at = models.DateTimeField(verbose_name='Дата и время отправки')
+
+    attempt = models.ForeignKey(Attempt, on_delete=models.CASCADE, verbose_name='Попытка рассылки')
+    mailing_settings = models.ForeignKey(MailingSettings, on_delete=models.CASCADE, verbose_name='Рассылка')
+
+    def __str__(self):
+        return f'{self.email}. {self.created_at} - {'Успешно' if self.is_success else 'Не успешно'}.'
+
+    class Meta:
+        verbose_name = 'Доставка письма'
+        verbose_name_plural = 'Доставки писем'
+
+
+class DeliveryStat(models.Model):
+    """Итоги отправки рассылки за час. Пополняются при записи журнала доставок, для отчётов не нужен GROUP BY по журналу"""
+    hour = models.DateTimeField(verbose_name='Час')
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='Отправлено')
+    success_count = models.PositiveIntegerField(default=0, verbose_name='Доставлено')
+    failure_count = models.PositiveIntegerField(default=0, verbose_name='Не доставлено')
+
+    mailing_settings = models.ForeignKey(MailingSettings, on_delete=models.CASCADE, verbose_name='Рассылка')
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, verbose_name='Владелец рассылки', **NULLABLE)
+
+    def __str__(self):
+        return f'{self.mailing_settings_id}. {self.hour}: {self.success_count}/{self.sent_count}'
+
+    class Meta:
+        verbose_name = 'Статистика доставки'
+        verbose_name_plural = 'Статистика доставки'
+        constraints = [
+            models.UniqueConstraint(fields=['mailing_settings', 'hour'], name='deliverystat_mailing_hour_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'hour'], name='deliverystat_owner_hour_idx'),
+            models.Index(fields=['hour'], name='deliverystat_hour_idx'),
+        ]
+
+
+class OutboxMessage(models.Model):
+    statuses = (('pending', 'ожидает отправки'), ('sending', 'отправляется'), ('failed', 'не доставлено'))
+
+    email = models.EmailField(verbose_name='Получатель')
+    from_email = models.EmailField(verbose_name='Отправитель', **NULLABLE)
+    subject = models.CharField(max_length=MAX_SUBJECT_LENGTH, verbose_name='Тема письма')
+    body = models.TextField(verbose_name='Текст письма', **NULLABLE)
+
+    status = models.CharField(max_length=10, choices=statuses, default='pending', verbose_name='Статус')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Поставлено в очередь')
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='Отправить не раньше')
+    locked_by = models.CharField(max_length=100, verbose_name='Захвачено обработчиком', **NULLABLE)
+    locked_until = models.DateTimeField(verbose_name='Захвачено до', **NULLABLE)
+    retries = models.PositiveSmallIntegerField(default=0, verbose_name='Повторных попыток')
+    last_error = models.TextField(verbose_name='Последняя ошибка', **NULLABLE)
+
+    attempt = models.ForeignKey(Attempt, on_delete=models.CASCADE, verbose_name='Попытка рассылки', **NULLABLE)
+
+    def __str__(self):
+        return f'{self.email}: {self.subject} ({self.get_status_display()})'
+
+    class Meta:
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
+        indexes = [
+            models.Index(fields=['available_at'], condition=models.Q(status='pending'), name='outbox_pending_idx'),
+            models.Index(fields=['locked_until'], condition=models.Q(status='sending'), name='outbox_sending_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['attempt', 'email'], name='outbox_unique_recipient'),
+        ]
+
+
+class DashboardCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True, verbose_name='Счётчик')
+    value = models.BigIntegerField(default=0, verbose_name='Значение')
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    class Meta:
+        verbose_name = 'Счётчик главной страницы'
+        verbose_name_plural = 'Счётчики главной страницы'
+
+
+class BlockedWord(models.Model):
+    word = models.CharField(max_length=100, unique=True, verbose_name='Слово')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+
+    def __str__(self):
+        return self.word
+
+    class Meta:
+        verbose_name = 'Запрещённое слово'
+        verbose_name_plural = 'Запрещённые слова'
@@ -0,0 +1,61 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+class KeysetPaginationMixin:
+    """
+    Постраничный вывод по ключу для ListView.
+    Следующая страница выбирается условием «после последней показанной записи» по (поле сортировки, id),
+    а не через OFFSET, поэтому любая страница стоит столько же, сколько первая.
+    """
+    page_size = 20
+    sort_fields = {'id': 'pk'}
+    default_sort = 'id'
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.sort_fields else self.default_sort
+
+    def get_queryset(self):
+        field = self.sort_fields[self.get_sort()]
+        queryset = super().get_queryset()
+        queryset = queryset.order_by('pk') if field == 'pk' else queryset.order_by(field, 'pk')
+
+        cursor = decode_cursor(self.request.GET.get('after'))
+        if cursor is not None:
+            value, pk = cursor
+            if field == 'pk':
+                queryset = queryset.filter(pk__gt=pk)
+            else:
+                queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        objects = list(self.object_list[:self.page_size + 1])
+        has_next = len(objects) > self.page_size
+        objects = objects[:self.page_size]
+
+        context_data = super().get_context_data(object_list=objects, **kwargs)
+        context_data['sort'] = self.get_sort()
+        context_data['is_first_page'] = not self.request.GET.get('after')
+        if has_next:
+            last = objects[-1]
+            field = self.sort_fields[context_data['sort']]
+            context_data['next_cursor'] = encode_cursor(getattr(last, field), last.pk)
+        return context_data
+
+
+def encode_cursor(value, pk):
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(pk)
+    except (ValueError, TypeError):
+        return None
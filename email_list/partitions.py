@@ -0,0 +1,142 @@
+import gzip
+import os
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# Журнал доставок разбит на помесячные секции по created_at, см. миграцию 0021_partition_delivery
+PARTITIONED_TABLE = 'email_list_delivery'
+PARTITION_RE = re.compile(rf'^{PARTITIONED_TABLE}_y(\d{{4}})m(\d{{2}})$')
+DEFAULT_PARTITION = f'{PARTITIONED_TABLE}_default'
+# Как часто долгоживущие обработчики проверяют секции на следующие месяцы, секунд
+PARTITIONS_CHECK_INTERVAL = 24 * 60 * 60
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARTITIONED_TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def create_partition(month):
+    """
+    Создаёт секцию за месяц, если её ещё нет.
+    Строки этого месяца, уже попавшие в секцию по умолчанию, переносятся в новую секцию:
+    иначе Postgres отказался бы создавать секцию, пересекающуюся со строками секции по умолчанию.
+    """
+    name = partition_name(month)
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return
+
+    # Пока секция по умолчанию отсоединена, журнал заблокирован, поэтому всё делается одной транзакцией
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARTITIONED_TABLE} '
+                       f'FOR VALUES FROM (%s) TO (%s)', bounds)
+        cursor.execute(f'INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} '
+                       f'WHERE created_at >= %s AND created_at < %s', bounds)
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s', bounds)
+        cursor.execute(f'ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+
+
+def ensure_partitions(months_ahead=None):
+    """Секции на текущий и несколько следующих месяцев, чтобы записи не попадали в секцию по умолчанию"""
+    months_ahead = settings.DELIVERY_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    current_month = date.today().replace(day=1)
+    for offset in range(months_ahead + 1):
+        create_partition(add_months(current_month, offset))
+
+
+def list_partitions():
+    """Помесячные секции журнала доставок: список (месяц, имя таблицы) по возрастанию"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [PARTITIONED_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions.append((date(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def archive_query(query, path):
+    """
+    Выгружает результат запроса в сжатый CSV через COPY.
+    Файл пишется под временным именем и переименовывается только после полной записи.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode='wb') as archive, connection.cursor() as cursor:
+            cursor.cursor.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+    os.replace(temporary_path, path)
+    return path
+
+
+def archive_partition(name, directory):
+    """Выгружает секцию в сжатый CSV и возвращает путь к архиву"""
+    return archive_query(f'SELECT * FROM {name}', os.path.join(directory, f'{name}.csv.gz'))
+
+
+def drop_partition(name, detach_only=False):
+    """Отсоединяет секцию от журнала и удаляет её таблицу; время не зависит от числа строк"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name}')
+        if not detach_only:
+            cursor.execute(f'DROP TABLE {name}')
+
+
+def get_oldest_kept_month(keep_months):
+    return add_months(date.today().replace(day=1), -(keep_months - 1))
+
+
+def get_expired_partitions(keep_months):
+    """Секции целиком старше keep_months месяцев, текущий месяц считается первым"""
+    oldest_kept = get_oldest_kept_month(keep_months)
+    return [(month, name) for month, name in list_partitions() if month < oldest_kept]
+
+
+def count_expired_default_rows(keep_months):
+    """Строки секции по умолчанию старше keep_months месяцев"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {DEFAULT_PARTITION} WHERE created_at < %s',
+                       [get_oldest_kept_month(keep_months).isoformat()])
+        return cursor.fetchone()[0]
+
+
+def prune_default_partition(keep_months, directory=None):
+    """
+    Удаляет из секции по умолчанию строки старше keep_months месяцев, с directory сначала выгружает их в архив.
+    Секцию по умолчанию нельзя отсоединить целиком, как помесячные, поэтому строки удаляются запросом.
+    Возвращает число удалённых строк и путь к архиву.
+    """
+    oldest_kept = get_oldest_kept_month(keep_months)
+    path = None
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Блокировка не даёт появиться новым старым строкам между выгрузкой и удалением
+        cursor.execute(f'LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE')
+        if directory is not None:
+            query = cursor.mogrify(f'SELECT * FROM {DEFAULT_PARTITION} WHERE created_at < %s',
+                                   [oldest_kept.isoformat()]).decode()
+            path = archive_query(query, os.path.join(
+                directory, f'{DEFAULT_PARTITION}_before_y{oldest_kept.year:04d}m{oldest_kept.month:02d}.csv.gz'))
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE created_at < %s', [oldest_kept.isoformat()])
+        return cursor.rowcount, path
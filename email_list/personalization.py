@@ -0,0 +1,63 @@
+import re
+import threading
+from collections import OrderedDict
+
+PLACEHOLDER_RE = re.compile(r'{{\s*(email|first_name|last_name|patronymic)\s*}}')
+PLACEHOLDERS_HELP = 'Можно использовать подстановки {{ first_name }}, {{ last_name }}, {{ patronymic }}, {{ email }}'
+
+COMPILED_CACHE_SIZE = 256
+# Длина поля OutboxMessage.subject: подстановка {{ email }} может удлинить тему сверх длины шаблона
+MAX_SUBJECT_LENGTH = 255
+LINE_BREAKS_RE = re.compile(r'[\r\n]+')
+
+
+class CompiledText:
+    """Текст, заранее разбитый на неизменяемые куски и подстановки полей клиента"""
+
+    def __init__(self, text):
+        # После split на нечётных местах стоят имена полей, на чётных — куски текста
+        self.parts = PLACEHOLDER_RE.split(text or '')
+        self.fields = set(self.parts[1::2])
+
+    def render(self, recipient):
+        if not self.fields:
+            return self.parts[0]
+        parts = self.parts.copy()
+        parts[1::2] = [recipient.get(field) or '' for field in self.parts[1::2]]
+        return ''.join(parts)
+
+
+class CompiledMessage:
+    def __init__(self, subject, body):
+        self.subject = CompiledText(subject)
+        self.body = CompiledText(body)
+        self.fields = ('email', *sorted((self.subject.fields | self.body.fields) - {'email'}))
+
+    def render(self, recipient):
+        """
+        Тема и текст письма для получателя, recipient — словарь с полями из self.fields.
+        Переводы строк из полей клиента в теме заменяются пробелами: в заголовке они недопустимы.
+        """
+        subject = LINE_BREAKS_RE.sub(' ', self.subject.render(recipient))[:MAX_SUBJECT_LENGTH]
+        return subject, self.body.render(recipient)
+
+
+_compiled_messages = OrderedDict()
+_compiled_messages_lock = threading.Lock()
+
+
+def get_compiled_message(mail_message):
+    """Разобранный шаблон сообщения. Кэшируется по id сообщения и времени его последнего изменения"""
+    key = (mail_message.pk, mail_message.updated_at)
+    with _compiled_messages_lock:
+        compiled = _compiled_messages.get(key)
+        if compiled is not None:
+            _compiled_messages.move_to_end(key)
+            return compiled
+
+    compiled = CompiledMessage(mail_message.subject, mail_message.message)
+    with _compiled_messages_lock:
+        _compiled_messages[key] = compiled
+        while len(_compiled_messages) > COMPILED_CACHE_SIZE:
+            _compiled_messages.popitem(last=False)
+    return compiled
@@ -0,0 +1,33 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from blog.models import BlogPost
+from email_list.models import Client, MailingMessage
+
+SEARCH_CONFIG = 'russian'
+
+
+def search(queryset, text):
+    """
+    Полнотекстовый поиск по полю search_vector (GIN-индекс), лучшие совпадения первыми.
+    Запрос понимает синтаксис поисковиков: "фраза", -исключить, or.
+    """
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query),
+    ).defer('search_vector').order_by('-rank', 'pk')
+
+
+def get_search_scopes(user):
+    """Где можно искать пользователю: клиенты и сообщения только свои, блог общий"""
+    scopes = {}
+    if user.is_authenticated:
+        clients = Client.objects.all()
+        messages = MailingMessage.objects.all()
+        if not user.is_superuser:
+            clients = clients.filter(owner=user)
+            messages = messages.filter(owner=user)
+        scopes['clients'] = ('Клиенты', clients)
+        scopes['messages'] = ('Сообщения', messages)
+    scopes['posts'] = ('Блог', BlogPost.objects.all())
+    return scopes
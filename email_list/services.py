@@ -1,76 +1,422 @@
-import smtplib
+import os
+import random
+import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from itertools import batched
 
 import pytz
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, send_mail
+from django.db import connections, transaction, IntegrityError
+from django.db.models import Q, F, Case, When, Value
+from django.utils import timezone
 
-from email_list.models import MailingSettings, Attempt
+from email_list.delivery import DeliveryResult, get_connection_pool
+from email_list.models import MailingSettings, Attempt, Delivery, OutboxMessage, DashboardCounter, Client, \
+    DeliveryStat
+from email_list.partitions import ensure_partitions
+from email_list.personalization import get_compiled_message
 from apscheduler.schedulers.background import BackgroundScheduler
 
 
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class DeliveryLogBuffer:
+    """
+    Копит результаты отправки по получателям и пишет их в базу пачками через bulk_create.
+    Итоги попыток рассылки обновляются при каждой записи пачки.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.DELIVERY_LOG_BATCH_SIZE
+        self.zone = pytz.timezone(settings.TIME_ZONE)
+        self._buffer = []
+        self._totals = {}
+        self._stats = {}
+
+    def add(self, result, attempt):
+        created_at = datetime.now(self.zone)
+        hour = created_at.replace(minute=0, second=0, microsecond=0)
+        totals = self._totals.setdefault(attempt.pk, {'success': 0, 'failure': 0, 'last_failure': None})
+        stats = self._stats.setdefault((attempt.mailing_settings_id, hour), {'success': 0, 'failure': 0})
+        if result.is_success:
+            totals['success'] += 1
+            stats['success'] += 1
+        else:
+            totals['failure'] += 1
+            totals['last_failure'] = result
+            stats['failure'] += 1
+
+        self._buffer.append(Delivery(
+            email=result.email,
+            is_success=result.is_success,
+            smtp_code=result.smtp_code,
+            server_response=result.server_response,
+            created_at=created_at,
+            attempt=attempt,
+            mailing_settings_id=attempt.mailing_settings_id,
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        with transaction.atomic():
+            Delivery.objects.bulk_create(self._buffer)
+            for attempt_pk, totals in self._totals.items():
+                updates = {
+                    'success_count': F('success_count') + totals['success'],
+                    'failure_count': F('failure_count') + totals['failure'],
+                }
+                if totals['last_failure']:
+                    updates['status'] = 'Не успешно'
+                    updates['server_response'] = (f'{totals['last_failure'].email}: '
+                                                  f'{totals['last_failure'].server_response}')
+                else:
+                    updates['status'] = Case(When(failure_count__gt=0, then=Value('Не успешно')),
+                                             default=Value('Успешно'))
+                Attempt.objects.filter(pk=attempt_pk).update(**updates)
+            for (mailing_settings_pk, hour), stats in self._stats.items():
+                add_delivery_stat(mailing_settings_pk, hour, stats['success'], stats['failure'])
+        self._buffer = []
+        self._totals = {}
+        self._stats = {}
+
+
+def add_delivery_stat(mailing_settings_pk, hour, success_count, failure_count):
+    """Прибавляет результаты отправки к часовой статистике рассылки, строка создаётся при первой отправке за час"""
+    updates = {
+        'sent_count': F('sent_count') + success_count + failure_count,
+        'success_count': F('success_count') + success_count,
+        'failure_count': F('failure_count') + failure_count,
+    }
+    if DeliveryStat.objects.filter(mailing_settings_id=mailing_settings_pk, hour=hour).update(**updates):
+        return
+
+    owner_id = MailingSettings.objects.filter(pk=mailing_settings_pk).values_list('owner_id', flat=True).first()
+    try:
+        # Другой обработчик мог создать строку за этот час одновременно с нами
+        with transaction.atomic():
+            DeliveryStat.objects.create(mailing_settings_id=mailing_settings_pk, owner_id=owner_id, hour=hour,
+                                        sent_count=success_count + failure_count,
+                                        success_count=success_count, failure_count=failure_count)
+    except IntegrityError:
+        DeliveryStat.objects.filter(mailing_settings_id=mailing_settings_pk, hour=hour).update(**updates)
+
+
+def build_email_message(subject, body, email, from_email=None):
+    return EmailMessage(subject=subject, body=body, from_email=from_email or settings.EMAIL_HOST_USER, to=[email])
+
+
+def retry_delay(retries):
+    """Экспоненциальная пауза перед повторной отправкой со случайным разбросом"""
+    delay = min(settings.OUTBOX_RETRY_MAX_SECONDS, settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** retries)
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def iter_recipient_chunks(mailing_settings, fields=('email',)):
+    """
+    Получатели читаются из базы потоком (только нужные поля) и отдаются пачками по RECIPIENT_CHUNK_SIZE.
+    Сегменты раскрываются одним запросом в момент отправки.
+    """
+    chunk_size = settings.RECIPIENT_CHUNK_SIZE
+    recipients = mailing_settings.get_recipients().order_by().values(*fields).iterator(chunk_size=chunk_size)
+    return batched(recipients, chunk_size)
+
+
+class ClaimLostError(Exception):
+    """Аренда рассылки истекла, и её захватил другой обработчик"""
+
+
+def renew_claim(mailing_settings):
+    """
+    Продлевает аренду рассылки, чтобы долгую отправку не захватил другой обработчик.
+    Вызывается перед каждой пачкой SMTP: при ограничении скорости даже одна пачка получателей
+    может отправляться дольше MAILING_LEASE_SECONDS.
+    """
+    if mailing_settings.claimed_by is None:
+        return
+    renewed = MailingSettings.objects.filter(pk=mailing_settings.pk, claimed_by=mailing_settings.claimed_by).update(
+        claimed_until=timezone.now() + timedelta(seconds=settings.MAILING_LEASE_SECONDS))
+    if not renewed:
+        raise ClaimLostError(f'Рассылка {mailing_settings.pk} захвачена другим обработчиком')
+
+
+def deliver_newsletter(mailing_settings, log):
+    """
+    Отправляет рассылку сразу, через пул SMTP-соединений.
+    Письма с временной ошибкой уходят в очередь на повторную отправку.
+    """
+    compiled_message = get_compiled_message(mailing_settings.mail_message)
+    pool = get_connection_pool()
+    delivery_log = DeliveryLogBuffer()
+    total_count = 0
+
+    try:
+        for recipients in iter_recipient_chunks(mailing_settings, compiled_message.fields):
+            for email_messages in batched((build_email_message(*compiled_message.render(recipient), recipient['email'])
+                                           for recipient in recipients), pool.batch_size):
+                renew_claim(mailing_settings)
+                total_count += len(email_messages)
+
+                retry_messages = []
+                for email_message, result in zip(email_messages, pool.send_messages(email_messages)):
+                    if result.is_temporary and settings.OUTBOX_MAX_RETRIES:
+                        retry_messages.append(OutboxMessage(
+                            email=result.email, subject=email_message.subject, body=email_message.body,
+                            attempt=log, retries=1, available_at=timezone.now() + retry_delay(0),
+                            last_error=result.server_response,
+                        ))
+                    else:
+                        delivery_log.add(result, log)
+                OutboxMessage.objects.bulk_create(retry_messages, ignore_conflicts=True)
+    finally:
+        # Результаты уже отправленных писем записываются, даже если рассылка прервана
+        delivery_log.flush()
+        Attempt.objects.filter(pk=log.pk).update(total_count=total_count)
+
+
+def enqueue_newsletter(mailing_settings, log):
+    """Ставит письма рассылки в очередь, их отправит обработчик очереди (команда mail)"""
+    compiled_message = get_compiled_message(mailing_settings.mail_message)
+    total_count = 0
+
+    for recipients in iter_recipient_chunks(mailing_settings, compiled_message.fields):
+        renew_claim(mailing_settings)
+        messages = []
+        for recipient in recipients:
+            subject, body = compiled_message.render(recipient)
+            messages.append(OutboxMessage(email=recipient['email'], subject=subject, body=body, attempt=log))
+        OutboxMessage.objects.bulk_create(messages, ignore_conflicts=True)
+        total_count += len(messages)
+
+    Attempt.objects.filter(pk=log.pk).update(total_count=total_count)
+
+
 def send_newsletter_email(mailing_settings):
+    zone = pytz.timezone(settings.TIME_ZONE)
+    log = Attempt.objects.create(mailing_settings=mailing_settings, last_attempt_datetime=datetime.now(zone))
+
+    if settings.MAILING_USE_OUTBOX:
+        enqueue_newsletter(mailing_settings, log)
+    else:
+        deliver_newsletter(mailing_settings, log)
+
+    # Аренда снимается, только если рассылка всё ещё за этим обработчиком
+    MailingSettings.objects.filter(pk=mailing_settings.pk, claimed_by=mailing_settings.claimed_by).update(
+        status='запущена', next_run_at=mailing_settings.calculate_next_run_at(log.last_attempt_datetime),
+        claimed_by=None, claimed_until=None)
+
+    log.refresh_from_db()
+    if settings.MAILING_USE_OUTBOX:
+        print(f'Рассылка поставлена в очередь: {log.total_count} писем')
+    else:
+        print(f'Попытка рассылки: {log.status}. Отправлено {log.success_count} из {log.total_count}')
+
+
+def send_service_email(subject, message, recipient_list, use_outbox=True):
+    """
+    Служебное письмо: при включённой очереди отправку берёт на себя обработчик очереди.
+    Письма с паролями отправляются с use_outbox=False, чтобы текст не хранился в базе.
+    """
+    if settings.MAILING_USE_OUTBOX and use_outbox:
+        OutboxMessage.objects.bulk_create(
+            [OutboxMessage(email=email, subject=subject, body=message) for email in recipient_list])
+    else:
+        send_mail(subject=subject, message=message, from_email=settings.EMAIL_HOST_USER,
+                  recipient_list=recipient_list, fail_silently=False)
+
+
+def claim_outbox_messages(worker_id, limit):
+    """
+    Захватывает пачку писем из очереди.
+    Письма, захваченные упавшим обработчиком, снова становятся доступны после истечения аренды.
+    """
+    current_datetime = timezone.now()
+    with transaction.atomic():
+        pks = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending', available_at__lte=current_datetime)
+                    | Q(status='sending', locked_until__lt=current_datetime))
+            .order_by('available_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        OutboxMessage.objects.filter(pk__in=pks).update(
+            status='sending', locked_by=worker_id,
+            locked_until=current_datetime + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+
+    return list(OutboxMessage.objects.filter(pk__in=pks).select_related('attempt').order_by('pk'))
+
+
+def send_outbox_messages(messages):
+    """
+    Отправляет пачку писем из очереди и возвращает результат по каждому.
+    Если пачка падает целиком, по одному досылаются только письма без результата: пул отправляет пачку частями,
+    и письма из уже отправленных частей повторно уйти не должны.
+    """
+    pool = get_connection_pool()
+    email_messages = [build_email_message(message.subject, message.body, message.email, message.from_email)
+                      for message in messages]
+    try:
+        return pool.send_messages(email_messages)
+    except Exception as e:
+        print(f'Ошибка отправки пачки из очереди, неотправленные письма отправляются по одному: {e}')
+
+    results = []
+    for email_message in email_messages:
+        result = getattr(email_message, 'delivery_result', None)
+        if result is None:
+            try:
+                result = pool.send_messages([email_message])[0]
+            except Exception as e:
+                # Сбой не означает, что адрес плохой: письмо остаётся временной ошибкой и будет повторено
+                result = DeliveryResult(email_message.to[0], False, None, str(e))
+        results.append(result)
+    return results
+
+
+def process_outbox(worker_id=None, limit=None):
+    """Отправляет одну пачку писем из очереди и возвращает её размер"""
+    messages = claim_outbox_messages(worker_id or get_worker_id(), limit or settings.OUTBOX_BATCH_SIZE)
+    if not messages:
+        return 0
+
+    results = send_outbox_messages(messages)
+
+    delivery_log = DeliveryLogBuffer()
+    failed_messages = []
+    retry_messages = []
+    for message, result in zip(messages, results):
+        if result.is_temporary and message.retries < settings.OUTBOX_MAX_RETRIES:
+            message.status = 'pending'
+            message.available_at = timezone.now() + retry_delay(message.retries)
+            message.retries += 1
+            retry_messages.append(message)
+        else:
+            if message.attempt is not None:
+                delivery_log.add(result, message.attempt)
+            if not result.is_success:
+                message.status = 'failed'
+                # Текст письма после окончательной ошибки не нужен, история остаётся в журнале доставок
+                message.body = ''
+                failed_messages.append(message)
+        if not result.is_success:
+            message.last_error = result.server_response
+            message.locked_by = None
+            message.locked_until = None
+
+    with transaction.atomic():
+        delivery_log.flush()
+        OutboxMessage.objects.bulk_update(
+            failed_messages + retry_messages,
+            ['status', 'body', 'available_at', 'retries', 'last_error', 'locked_by', 'locked_until'])
+        # Отправленные письма удаляются из очереди, история остаётся в журнале доставок
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).exclude(
+            pk__in=[message.pk for message in failed_messages + retry_messages]).delete()
+
+    print(f'Обработано писем из очереди: {len(messages)}, не доставлено: {len(failed_messages)}, '
+          f'отложено: {len(retry_messages)}')
+    return len(messages)
+
+
+def _send_newsletter_email_in_thread(mailing_settings):
     try:
-        server_response = send_mail(
-            subject=mailing_settings.mail_message.subject,
-            message=mailing_settings.mail_message.message,
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[client.email for client in mailing_settings.clients.all()],
-            fail_silently=False,
+        send_newsletter_email(mailing_settings)
+    finally:
+        # У каждого потока своё подключение к БД, его нужно закрыть до возврата потока в пул
+        connections.close_all()
+
+
+def dispatch_mailings(mailings):
+    """Отправляет рассылки параллельно, не более MAILING_CONCURRENCY одновременно"""
+    if settings.MAILING_CONCURRENCY <= 1 or len(mailings) <= 1:
+        for mailing_settings in mailings:
+            try:
+                send_newsletter_email(mailing_settings)
+            except Exception as e:
+                print(f'Ошибка рассылки {mailing_settings.pk}: {e}')
+        return
+
+    with ThreadPoolExecutor(max_workers=settings.MAILING_CONCURRENCY) as executor:
+        futures = {executor.submit(_send_newsletter_email_in_thread, obj): obj for obj in mailings}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f'Ошибка рассылки {futures[future].pk}: {e}')
+
+
+def claim_due_mailings(worker_id, current_datetime, limit=None):
+    """
+    Захватывает подошедшие рассылки за этим обработчиком на время аренды.
+    Строки, заблокированные другими обработчиками, пропускаются (SKIP LOCKED),
+    а рассылки с истёкшей арендой считаются свободными.
+    """
+    limit = limit or settings.MAILING_CLAIM_BATCH_SIZE
+    lease_until = current_datetime + timedelta(seconds=settings.MAILING_LEASE_SECONDS)
+
+    with transaction.atomic():
+        pks = list(
+            MailingSettings.objects.select_for_update(skip_locked=True)
+            .filter(is_active=True, next_run_at__lte=current_datetime)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=current_datetime))
+            .order_by('next_run_at')
+            .values_list('pk', flat=True)[:limit]
         )
-        log = Attempt.objects.filter(mailing_settings=mailing_settings)[0]
-        zone = pytz.timezone(settings.TIME_ZONE)
-        log.last_attempt_datetime = datetime.now(zone)
-
-        if server_response:
-            log.status = 'Успешно'
-            log.save()
-        if mailing_settings.status == 'создана' or mailing_settings.status == 'завершена':
-            mailing_settings.status = 'запущена'
-            mailing_settings.save()
-    except smtplib.SMTPException as e:
-        log = Attempt.objects.filter(mailing_settings=mailing_settings)[0]
-        zone = pytz.timezone(settings.TIME_ZONE)
-        log.last_attempt_datetime = datetime.now(zone)
-        log.server_response = e
-        log.status = 'Не успешно'
-        log.save()
-        mailing_settings.status = 'запущена'
-        mailing_settings.save()
-    print(f'Попытка рассылки: {log.status}')
-
-
-def send_newsletter_periodic_email():
+        MailingSettings.objects.filter(pk__in=pks).update(claimed_by=worker_id, claimed_until=lease_until)
+
+    return list(MailingSettings.objects.filter(pk__in=pks).select_related('mail_message'))
+
+
+def send_newsletter_periodic_email(worker_id=None):
     zone = pytz.timezone(settings.TIME_ZONE)
     current_datetime = datetime.now(zone)
     print(f'Текущее время - {current_datetime}')
 
-    for obj in MailingSettings.objects.filter(is_active=True):
-        if Attempt.objects.filter(mailing_settings=obj).exists():
-            log = Attempt.objects.filter(mailing_settings=obj)[0]
+    due_mailings = []
+    completed_mailings = []
+    claimed_mailings = claim_due_mailings(worker_id or get_worker_id(), current_datetime)
+    for obj in claimed_mailings:
+        if current_datetime > obj.end_datetime:
+            completed_mailings.append(obj)
         else:
-            log = Attempt.objects.create(mailing_settings=obj, last_attempt_datetime=current_datetime)
-            print('Первая попытка рассылки')
-            send_newsletter_email(obj)
+            due_mailings.append(obj)
+    print(f'Рассылок к отправке: {len(due_mailings)}')
+
+    dispatch_mailings(due_mailings)
+
+    for obj in completed_mailings:
+        obj.status = 'завершена'
+        obj.is_active = False
+        obj.claimed_by = None
+        obj.claimed_until = None
+        obj.save()
+    return len(claimed_mailings)
+
+
+def increment_counter(name, delta=1):
+    DashboardCounter.objects.filter(name=name).update(value=F('value') + delta)
 
-        if obj.start_datetime < current_datetime < obj.end_datetime:
 
-            current_timedelta = current_datetime - log.last_attempt_datetime
+def reconcile_counters():
+    """Пересчитывает счётчики главной страницы по таблицам, исправляя расхождения после массовых операций"""
+    counters = {
+        'mailings': MailingSettings.objects.count(),
+        'active_mailings': MailingSettings.objects.filter(is_active=True).count(),
+        'clients': Client.objects.count(),
+    }
+    for name, value in counters.items():
+        DashboardCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return counters
 
-            if obj.period == 'per_day' and current_timedelta >= timedelta(days=1):
-                send_newsletter_email(obj)
-                print(f'Выполнена повторная рассылка раз в день')
-            elif obj.period == 'per_week' and current_timedelta >= timedelta(weeks=1):
-                send_newsletter_email(obj)
-                print(f'Выполнена повторная рассылка раз в неделю')
-            elif obj.period == 'per_month' and current_timedelta >= timedelta(weeks=4):
-                send_newsletter_email(obj)
-                print(f'Выполнена повторная рассылка раз в месяц')
 
-        elif current_datetime > obj.end_datetime:
-            obj.status = 'завершена'
-            obj.is_active = False
-            obj.save()
+def get_counters():
+    return dict(DashboardCounter.objects.values_list('name', 'value'))
 
 
 def start_scheduler():
@@ -80,6 +426,9 @@ def start_scheduler():
     if not scheduler.get_jobs():
         print('Создание работы')
         scheduler.add_job(send_newsletter_periodic_email, 'interval', seconds=60)
+        scheduler.add_job(process_outbox, 'interval', seconds=10)
+        scheduler.add_job(reconcile_counters, 'interval', hours=1)
+        scheduler.add_job(ensure_partitions, 'interval', days=1)
 
     if not scheduler.running:
         print('Запуск планировщика')
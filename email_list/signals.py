@@ -0,0 +1,52 @@
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from email_list.models import Client, MailingSettings, Attempt
+from email_list.services import increment_counter
+
+
+@receiver(post_init, sender=MailingSettings)
+def remember_is_active(sender, instance, **kwargs):
+    # Поле могло быть не загружено (only/defer), обращение к нему вызвало бы лишний запрос
+    instance._counted_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(pre_save, sender=MailingSettings)
+def schedule_mailing(sender, instance, update_fields=None, **kwargs):
+    # При любом редактировании, в том числе при loaddata (raw), расписание пересчитывается от последней попытки
+    if update_fields is not None:
+        return
+    last_run_at = None
+    if instance.pk:
+        last_run_at = Attempt.objects.filter(mailing_settings_id=instance.pk).order_by(
+            '-last_attempt_datetime').values_list('last_attempt_datetime', flat=True).first()
+    instance.next_run_at = instance.calculate_next_run_at(last_run_at)
+
+
+@receiver(post_save, sender=MailingSettings)
+def count_saved_mailing(sender, instance, created, **kwargs):
+    if created:
+        increment_counter('mailings')
+        if instance.is_active:
+            increment_counter('active_mailings')
+    elif instance._counted_is_active is not None and instance.is_active != instance._counted_is_active:
+        increment_counter('active_mailings', 1 if instance.is_active else -1)
+    instance._counted_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=MailingSettings)
+def count_deleted_mailing(sender, instance, **kwargs):
+    increment_counter('mailings', -1)
+    if instance._counted_is_active:
+        increment_counter('active_mailings', -1)
+
+
+@receiver(post_save, sender=Client)
+def count_saved_client(sender, instance, created, **kwargs):
+    if created:
+        increment_counter('clients')
+
+
+@receiver(post_delete, sender=Client)
+def count_deleted_client(sender, instance, **kwargs):
+    increment_counter('clients', -1)
@@ -1,3 +1,498 @@
-from django.test import TestCase
+import json
+import os
+import random
+import resource
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.utils import timezone
+
+from config.testing import PageBudgetMixin, percentile
+from email_list import urls
+from email_list.content_filter import ContentFilter, find_blocked_words
+from email_list.partitions import DEFAULT_PARTITION, create_partition, partition_name, prune_default_partition
+from email_list.delivery import DeliveryResult, PooledEmailBackend, SMTPConnectionPool
+from email_list.models import Client, MailingMessage, MailingSettings, Delivery, OutboxMessage, Segment, \
+    BlockedWord, Attempt
+from email_list.personalization import CompiledMessage, MAX_SUBJECT_LENGTH
+from email_list.services import send_newsletter_periodic_email, build_email_message, send_newsletter_email, \
+    ClaimLostError, process_outbox, retry_delay, iter_recipient_chunks
+from users.models import User
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и выбрасывает их"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        self.reply('220 sink ESMTP')
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-sink')
+                self.reply('250 8BITMIME')
+            elif command in (b'HELO', b'MAIL', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            elif command == b'RCPT':
+                if server.error_rate and random.random() < server.error_rate:
+                    self.reply(server.error_reply)
+                else:
+                    self.reply('250 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                if server.latency:
+                    time.sleep(server.latency)
+                with server.lock:
+                    server.received += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_reply='451 4.3.0 Try again later'):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_reply = error_reply
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPConnectionPoolTest(SimpleTestCase):
+
+    def send(self, emails, **sink_options):
+        with SMTPSink(**sink_options) as sink:
+            host, port = sink.server_address
+            with override_settings(EMAIL_HOST=host, EMAIL_PORT=port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                                   EMAIL_HOST_USER='sender@example.com', EMAIL_HOST_PASSWORD='',
+                                   EMAIL_RATE_LIMIT=0):
+                pool = SMTPConnectionPool(size=1, batch_size=10)
+                results = pool.send_messages([build_email_message('Тема', 'Текст', email) for email in emails])
+                pool.close()
+        return results, sink.received
+
+    def test_bad_address_does_not_fail_batch(self):
+        results, received = self.send(['a@example.com', 'bad\n@example.com', 'c@example.com'])
+        self.assertEqual([result.is_success for result in results], [True, False, True])
+        self.assertEqual(received, 2)
+        self.assertTrue(results[1].is_permanent)
+        self.assertFalse(results[1].is_temporary)
+
+    def test_temporary_and_permanent_rejections(self):
+        results, _ = self.send(['a@example.com'], error_rate=1, error_reply='451 4.3.0 Try again later')
+        self.assertEqual(results[0].smtp_code, 451)
+        self.assertTrue(results[0].is_temporary)
+
+        results, _ = self.send(['a@example.com'], error_rate=1, error_reply='550 5.1.1 No such user')
+        self.assertEqual(results[0].smtp_code, 550)
+        self.assertFalse(results[0].is_temporary)
+
+
+class ContentFilterTest(SimpleTestCase):
+
+    def test_prefix_matching(self):
+        content_filter = ContentFilter(['казино', 'займ'])
+        self.assertEqual(content_filter.find('Лучшее КАЗИНОшное предложение'), ['КАЗИНОшное'])
+        # Слово ищется только с начала слова в тексте
+        self.assertEqual(content_filter.find('наказино и подзайм'), [])
+
+    def test_normalization(self):
+        content_filter = ContentFilter(['ёлка', 'скидка'])
+        # Латинские c, k, a вместо кириллических и е вместо ё
+        self.assertEqual(content_filter.find('Ckидka с елками'), ['Ckидka', 'елками'])
+
+    def test_reports_all_hits(self):
+        content_filter = ContentFilter(['казино', 'займ', 'кредит'])
+        self.assertEqual(content_filter.find('Займ, кредит и снова займы в казино'),
+                         ['Займ', 'кредит', 'казино'])
+        self.assertEqual(ContentFilter([]).find('займ'), [])
+
+
+class ContentFilterReloadTest(TestCase):
+
+    @override_settings(CONTENT_FILTER_CHECK_SECONDS=0)
+    def test_reloads_after_table_changes(self):
+        self.assertEqual(find_blocked_words('Быстрый займ'), [])
+        word = BlockedWord.objects.create(word='займ')
+        self.assertEqual(find_blocked_words('Быстрый займ'), ['займ'])
+        # Изменение в обход сигналов, как из другого процесса или через update()
+        BlockedWord.objects.filter(pk=word.pk).update(word='кредит', updated_at=timezone.now())
+        self.assertEqual(find_blocked_words('Быстрый займ в кредит'), ['кредит'])
+        BlockedWord.objects.all().delete()
+        self.assertEqual(find_blocked_words('Быстрый кредит'), [])
+
+    @override_settings(CONTENT_FILTER_CHECK_SECONDS=60)
+    def test_version_is_checked_once_per_interval(self):
+        with mock.patch('email_list.content_filter.time.monotonic', return_value=10 ** 6):
+            find_blocked_words('Быстрый займ')
+            with self.assertNumQueries(0):
+                for _ in range(100):
+                    find_blocked_words('Быстрый займ')
+
+
+class CompiledMessageTest(SimpleTestCase):
+
+    def test_subject_is_single_line_and_fits_outbox(self):
+        compiled = CompiledMessage('Здравствуйте, {{ first_name }} {{ email }}', 'Уважаемый {{ first_name }}')
+        subject, body = compiled.render({'email': 'a' * 250 + '@example.com', 'first_name': 'Иван\r\nBcc: x@y'})
+        self.assertNotIn('\n', subject)
+        self.assertNotIn('\r', subject)
+        self.assertTrue(subject.startswith('Здравствуйте, Иван Bcc: x@y '))
+        self.assertEqual(len(subject), MAX_SUBJECT_LENGTH)
+        self.assertEqual(body, 'Уважаемый Иван\r\nBcc: x@y')
+
+
+class DeliveryResultTest(SimpleTestCase):
+
+    def test_is_temporary(self):
+        self.assertFalse(DeliveryResult('a@example.com', True).is_temporary)
+        self.assertTrue(DeliveryResult('a@example.com', False, 421).is_temporary)
+        self.assertTrue(DeliveryResult('a@example.com', False, 452).is_temporary)
+        self.assertFalse(DeliveryResult('a@example.com', False, 550).is_temporary)
+        self.assertFalse(DeliveryResult('a@example.com', False, 554).is_temporary)
+        # Обрыв соединения без кода ответа
+        self.assertTrue(DeliveryResult('a@example.com', False, None, 'Connection reset').is_temporary)
+        self.assertFalse(DeliveryResult('a@example.com', False, None, 'Нет получателей', True).is_temporary)
+
+    @override_settings(OUTBOX_RETRY_BASE_SECONDS=60, OUTBOX_RETRY_MAX_SECONDS=3600)
+    def test_retry_delay_bounds(self):
+        for retries in range(12):
+            delay = min(3600, 60 * 2 ** retries)
+            for _ in range(50):
+                seconds = retry_delay(retries).total_seconds()
+                self.assertGreaterEqual(seconds, delay / 2)
+                self.assertLessEqual(seconds, delay)
+
+
+class MailingScheduleTest(TestCase):
+
+    def test_raw_save_sets_next_run_at(self):
+        # loaddata сохраняет объекты с raw=True, минуя save()
+        start = timezone.now() - timedelta(hours=1)
+        mailing = MailingSettings(start_datetime=start, end_datetime=start + timedelta(days=7), period='per_day')
+        mailing.save_base(raw=True)
+        mailing.refresh_from_db()
+        self.assertEqual(mailing.next_run_at, start)
+
+
+class SegmentTest(TestCase):
+
+    def test_recipients_combine_clients_and_segments_without_duplicates(self):
+        owner = User.objects.create(email='owner@example.com')
+        now = timezone.now()
+        mailing = MailingSettings.objects.create(start_datetime=now, end_datetime=now + timedelta(days=1),
+                                                 period='per_day', owner=owner)
+        manual, segment_client, _ = Client.objects.bulk_create(
+            Client(email=email, first_name='Имя', last_name='Фамилия', owner=owner)
+            for email in ('manual@example.com', 'segment@example.org', 'other@example.net'))
+        manual_in_segment = Client.objects.create(email='both@example.org', first_name='Имя', last_name='Фамилия',
+                                                  owner=owner)
+        mailing.clients.add(manual, manual_in_segment)
+        mailing.segments.add(Segment.objects.create(name='Сегмент', email_domain='example.org', owner=owner))
+
+        recipients = [row for chunk in iter_recipient_chunks(mailing, ('email', 'first_name')) for row in chunk]
+        self.assertEqual(sorted(row['email'] for row in recipients),
+                         ['both@example.org', 'manual@example.com', 'segment@example.org'])
+
+    def test_segment_without_owner_selects_nobody(self):
+        Client.objects.create(email='orphan@example.com', first_name='Имя', last_name='Фамилия')
+        segment = Segment.objects.create(name='Без владельца', email_domain='example.com')
+        self.assertFalse(segment.get_clients().exists())
+        self.assertFalse(Client.objects.filter(segment.get_filter()).exists())
+
+
+@override_settings(MAILING_USE_OUTBOX=True)
+class MailingClaimTest(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        message = MailingMessage.objects.create(subject='Тема', message='Текст')
+        self.mailing = MailingSettings.objects.create(mail_message=message, period='per_day',
+                                                      start_datetime=now - timedelta(days=1),
+                                                      end_datetime=now + timedelta(days=1))
+        self.mailing.clients.add(Client.objects.create(email='client@example.com', first_name='Имя',
+                                                       last_name='Фамилия'))
+
+    def claim(self, worker_id):
+        MailingSettings.objects.filter(pk=self.mailing.pk).update(claimed_by=worker_id,
+                                                                  claimed_until=timezone.now())
+        return MailingSettings.objects.get(pk=self.mailing.pk)
+
+    def test_claim_renewed_and_released(self):
+        send_newsletter_email(self.claim('worker-1'))
+        mailing = MailingSettings.objects.get(pk=self.mailing.pk)
+        self.assertIsNone(mailing.claimed_by)
+        self.assertGreater(mailing.next_run_at, timezone.now())
+
+    def test_lost_claim_stops_sending(self):
+        mailing = self.claim('worker-1')
+        self.claim('worker-2')
+        with self.assertRaises(ClaimLostError):
+            send_newsletter_email(mailing)
+        self.assertEqual(MailingSettings.objects.get(pk=self.mailing.pk).claimed_by, 'worker-2')
+
+    @override_settings(MAILING_USE_OUTBOX=False)
+    def test_claim_renewed_per_smtp_batch(self):
+        self.mailing.clients.add(Client.objects.create(email='second@example.com', first_name='Имя',
+                                                       last_name='Фамилия'))
+        claim = self.claim
+
+        class StealingPool:
+            """Пул по одному письму в пачке: после первой пачки рассылку захватывает другой обработчик"""
+            batch_size = 1
+
+            def __init__(self):
+                self.sent = []
+
+            def send_messages(self, email_messages):
+                self.sent.extend(email_messages)
+                claim('worker-2')
+                return [DeliveryResult(message.to[0], True) for message in email_messages]
+
+        pool = StealingPool()
+        with mock.patch('email_list.services.get_connection_pool', return_value=pool), \
+                self.assertRaises(ClaimLostError):
+            send_newsletter_email(self.claim('worker-1'))
+        self.assertEqual(len(pool.sent), 1)
+
+
+class PoisonPool:
+    """
+    Пул, который роняет всю пачку на письме для poison@example.com.
+    Письма перед ним успевают уйти и получают delivery_result, как в настоящем пуле.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            if message.to[0] == 'poison@example.com':
+                raise RuntimeError('poison')
+            message.delivery_result = DeliveryResult(message.to[0], True)
+            self.sent.append(message.to[0])
+        return [message.delivery_result for message in email_messages]
+
+
+class OutboxTest(TestCase):
+
+    def test_poison_message_does_not_block_batch(self):
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(email=email, subject='Тема', body='Текст')
+            for email in ('a@example.com', 'poison@example.com', 'c@example.com')
+        )
+        pool = PoisonPool()
+        with mock.patch('email_list.services.get_connection_pool', return_value=pool):
+            self.assertEqual(process_outbox('worker'), 3)
+        # Уже отправленное письмо не отправляется повторно
+        self.assertEqual(pool.sent, ['a@example.com', 'c@example.com'])
+
+        # Сбой считается временной ошибкой, письмо откладывается до следующей попытки
+        delayed = OutboxMessage.objects.get()
+        self.assertEqual((delayed.email, delayed.status, delayed.retries), ('poison@example.com', 'pending', 1))
+
+    @override_settings(OUTBOX_MAX_RETRIES=0)
+    def test_failed_message_body_is_cleared(self):
+        OutboxMessage.objects.create(email='poison@example.com', subject='Тема', body='Пароль')
+        with mock.patch('email_list.services.get_connection_pool', return_value=PoisonPool()):
+            process_outbox('worker')
+
+        failed = OutboxMessage.objects.get()
+        self.assertEqual((failed.status, failed.body), ('failed', ''))
+
+
+class PartitionTest(TestCase):
+
+    def setUp(self):
+        start = timezone.now()
+        self.mailing = MailingSettings.objects.create(start_datetime=start, end_datetime=start + timedelta(days=7),
+                                                      period='per_day')
+        self.attempt = Attempt.objects.create(mailing_settings=self.mailing, last_attempt_datetime=start)
+
+    def add_delivery(self, created_at):
+        return Delivery.objects.create(email='client@example.com', is_success=True, smtp_code=250,
+                                       created_at=timezone.make_aware(created_at),
+                                       attempt=self.attempt, mailing_settings=self.mailing)
+
+    def count_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+    def test_create_partition_moves_rows_from_default(self):
+        # Секции на этот месяц нет, строка попадает в секцию по умолчанию
+        delivery = self.add_delivery(datetime(2099, 1, 15))
+        self.assertEqual(self.count_rows(DEFAULT_PARTITION), 1)
+
+        create_partition(date(2099, 1, 1))
+        self.assertEqual(self.count_rows(DEFAULT_PARTITION), 0)
+        self.assertEqual(self.count_rows(partition_name(date(2099, 1, 1))), 1)
+        self.assertTrue(Delivery.objects.filter(pk=delivery.pk).exists())
+        # Секция по умолчанию снова подключена
+        self.add_delivery(datetime(2099, 5, 15))
+        self.assertEqual(self.count_rows(DEFAULT_PARTITION), 1)
+
+    def test_prune_default_partition(self):
+        self.add_delivery(datetime(2000, 1, 15))
+        self.add_delivery(datetime(2099, 1, 15))
+        with tempfile.TemporaryDirectory() as directory:
+            deleted, path = prune_default_partition(12, directory)
+            self.assertEqual(deleted, 1)
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.count_rows(DEFAULT_PARTITION), 1)
+
+
+@tag('benchmark')
+@unittest.skipUnless(os.environ.get('BENCHMARK'), 'Бенчмарк запускается с переменной окружения BENCHMARK=1')
+class DispatcherBenchmark(TransactionTestCase):
+    """
+    Пропускная способность отправки рассылок через локальный SMTP-сервер.
+    Параметры задаются переменными окружения BENCHMARK_MAILINGS, BENCHMARK_CLIENTS,
+    BENCHMARK_LATENCY_MS, BENCHMARK_ERROR_RATE, отчёт дописывается в BENCHMARK_OUTPUT.
+    """
+
+    mailings_count = int(os.environ.get('BENCHMARK_MAILINGS', 10))
+    clients_count = int(os.environ.get('BENCHMARK_CLIENTS', 500))
+    latency = float(os.environ.get('BENCHMARK_LATENCY_MS', 5)) / 1000
+    error_rate = float(os.environ.get('BENCHMARK_ERROR_RATE', 0))
+
+    def seed(self):
+        now = timezone.now()
+        message = MailingMessage.objects.create(subject='Здравствуйте, {{ first_name }}',
+                                                message='Уважаемый {{ first_name }} {{ patronymic }}!\n' * 20)
+        clients = Client.objects.bulk_create(
+            Client(email=f'client{i}@example.com', first_name=f'Имя{i}', last_name=f'Фамилия{i}',
+                   patronymic='Отчество')
+            for i in range(self.clients_count)
+        )
+        mailings = [
+            MailingSettings.objects.create(mail_message=message, period='per_day',
+                                           start_datetime=now - timedelta(days=1),
+                                           end_datetime=now + timedelta(days=1))
+            for _ in range(self.mailings_count)
+        ]
+        MailingSettings.clients.through.objects.bulk_create(
+            MailingSettings.clients.through(mailingsettings_id=mailing.pk, client_id=client.pk)
+            for mailing in mailings for client in clients
+        )
+
+    def test_dispatcher_throughput(self):
+        self.seed()
+
+        latencies = []
+        queries = count()
+        original_send = PooledEmailBackend._send
+        original_execute = CursorWrapper._execute_with_wrappers
+
+        def timed_send(backend, email_message):
+            started = time.perf_counter()
+            try:
+                return original_send(backend, email_message)
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+        def counted_execute(cursor, *args, **kwargs):
+            next(queries)
+            return original_execute(cursor, *args, **kwargs)
+
+        with SMTPSink(self.latency, self.error_rate) as sink:
+            host, port = sink.server_address
+            with override_settings(EMAIL_HOST=host, EMAIL_PORT=port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                                   EMAIL_HOST_USER='bench@example.com', EMAIL_HOST_PASSWORD='',
+                                   MAILING_CLAIM_BATCH_SIZE=self.mailings_count, MAILING_USE_OUTBOX=False):
+                pool = SMTPConnectionPool()
+                with mock.patch('email_list.services.get_connection_pool', return_value=pool), \
+                        mock.patch.object(PooledEmailBackend, '_send', timed_send), \
+                        mock.patch.object(CursorWrapper, '_execute_with_wrappers', counted_execute):
+                    started = time.perf_counter()
+                    send_newsletter_periodic_email('benchmark')
+                    elapsed = time.perf_counter() - started
+                pool.close()
+
+        report = {
+            'mailings': self.mailings_count,
+            'clients': self.clients_count,
+            'latency_ms': self.latency * 1000,
+            'error_rate': self.error_rate,
+            'messages': len(latencies),
+            'received': sink.received,
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0,
+            'queries': next(queries),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+        print(json.dumps(report, ensure_ascii=False))
+        if os.environ.get('BENCHMARK_OUTPUT'):
+            with open(os.environ['BENCHMARK_OUTPUT'], 'a') as output:
+                output.write(json.dumps(report, ensure_ascii=False) + '\n')
+
+        self.assertEqual(len(latencies), self.mailings_count * self.clients_count)
+        self.assertEqual(Delivery.objects.filter(is_success=True).count(), sink.received)
+
+
+@tag('performance')
+class EmailListPageBudgetTest(PageBudgetMixin, TestCase):
+    url_module = urls
+    pages = {
+        'email_list:main': (None, 7),
+        'email_list:client_create': (None, 4),
+        'email_list:client_list': (None, 5),
+        'email_list:client_import': (None, 4),
+        'email_list:client_export': (None, 4),
+        'email_list:client_search': (None, 3),
+        'email_list:client_detail': (lambda data: {'pk': data.client.pk}, 6),
+        'email_list:client_update': (lambda data: {'pk': data.client.pk}, 6),
+        'email_list:client_delete': (lambda data: {'pk': data.client.pk}, 6),
+        'email_list:mailing_message_create': (None, 4),
+        'email_list:mailing_message_list': (None, 5),
+        'email_list:mailing_message_detail': (lambda data: {'pk': data.message.pk}, 6),
+        'email_list:mailing_message_update': (lambda data: {'pk': data.message.pk}, 6),
+        'email_list:mailing_message_delete': (lambda data: {'pk': data.message.pk}, 6),
+        'email_list:segment_create': (None, 4),
+        'email_list:segment_list': (None, 5),
+        'email_list:segment_detail': (lambda data: {'pk': data.segment.pk}, 7),
+        'email_list:segment_update': (lambda data: {'pk': data.segment.pk}, 5),
+        'email_list:segment_delete': (lambda data: {'pk': data.segment.pk}, 5),
+        'email_list:mailing_settings_create': (None, 6),
+        'email_list:mailing_settings_list': (None, 6),
+        'email_list:mailing_settings_detail': (lambda data: {'pk': data.mailing.pk}, 7),
+        'email_list:mailing_settings_update': (lambda data: {'pk': data.mailing.pk}, 11),
+        'email_list:mailing_settings_delete': (lambda data: {'pk': data.mailing.pk}, 7),
+        'email_list:attempt_detail': (lambda data: {'pk': data.attempt.pk}, 11),
+        'email_list:analytics': (None, 6),
+        'email_list:search': (None, 4),
+        'email_list:plug': (None, 4),
+    }
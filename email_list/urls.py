@@ -2,10 +2,14 @@ from django.urls import path
 from django.views.decorators.cache import cache_page
 
 from email_list.apps import EmailListConfig
-from email_list.views import ClientListView, ClientDetailView, ClientCreateView, ClientUpdateView, ClientDeleteView, \
-    PlugTemplateView, MailingMessageCreateView, MailingMessageListView, MailingMessageDetailView, \
-    MailingMessageUpdateView, MailingMessageDeleteView, MailingSettingsCreateView, MailingSettingsListView, \
-    MailingSettingsDetailView, MailingSettingsUpdateView, MailingSettingsDeleteView, MainPageView, AttemptDetailView
+from email_list.views import (
+    ClientListView, ClientDetailView, ClientCreateView, ClientUpdateView, ClientDeleteView, PlugTemplateView,
+    ClientImportView, ClientExportView, ClientSearchView, MailingMessageCreateView, MailingMessageListView,
+    MailingMessageDetailView, MailingMessageUpdateView, MailingMessageDeleteView, MailingSettingsCreateView,
+    MailingSettingsListView, MailingSettingsDetailView, MailingSettingsUpdateView, MailingSettingsDeleteView,
+    MainPageView, AttemptDetailView, SearchView, AnalyticsView, SegmentCreateView, SegmentListView, SegmentDetailView,
+    SegmentUpdateView, SegmentDeleteView,
+)
 
 app_name = EmailListConfig.name
 
@@ -13,6 +17,9 @@ urlpatterns = [
     path('', cache_page(10)(MainPageView.as_view()), name='main'),
     path('client/create/', ClientCreateView.as_view(), name='client_create'),
     path('client/list', ClientListView.as_view(), name='client_list'),
+    path('client/import/', ClientImportView.as_view(), name='client_import'),
+    path('client/export/', ClientExportView.as_view(), name='client_export'),
+    path('client/search/', ClientSearchView.as_view(), name='client_search'),
     path('client/<int:pk>/', ClientDetailView.as_view(), name='client_detail'),
     path('client/update/<int:pk>/', ClientUpdateView.as_view(), name='client_update'),
     path('client/delete/<int:pk>/', ClientDeleteView.as_view(), name='client_delete'),
@@ -21,11 +28,18 @@ urlpatterns = [
     path('mailingmessage/<int:pk>/', MailingMessageDetailView.as_view(), name='mailing_message_detail'),
     path('mailingmessage/update/<int:pk>/', MailingMessageUpdateView.as_view(), name='mailing_message_update'),
     path('mailingmessage/delete/<int:pk>/', MailingMessageDeleteView.as_view(), name='mailing_message_delete'),
+    path('segment/create/', SegmentCreateView.as_view(), name='segment_create'),
+    path('segment/list', SegmentListView.as_view(), name='segment_list'),
+    path('segment/<int:pk>/', SegmentDetailView.as_view(), name='segment_detail'),
+    path('segment/update/<int:pk>/', SegmentUpdateView.as_view(), name='segment_update'),
+    path('segment/delete/<int:pk>/', SegmentDeleteView.as_view(), name='segment_delete'),
     path('mailingsettings/create/', MailingSettingsCreateView.as_view(), name='mailing_settings_create'),
     path('mailingsettings/list', MailingSettingsListView.as_view(), name='mailing_settings_list'),
     path('mailingsettings/<int:pk>/', MailingSettingsDetailView.as_view(), name='mailing_settings_detail'),
     path('mailingsettings/update/<int:pk>/', MailingSettingsUpdateView.as_view(), name='mailing_settings_update'),
     path('mailingsettings/delete/<int:pk>', MailingSettingsDeleteView.as_view(), name='mailing_settings_delete'),
     path('attempt/<int:pk>/', AttemptDetailView.as_view(), name='attempt_detail'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('search/', SearchView.as_view(), name='search'),
     path('plug/', PlugTemplateView.as_view(), name='plug'),
 ]
@@ -1,14 +1,26 @@
-import random
+from datetime import timedelta
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
+from django.db.models import OuterRef, Subquery, Q, Sum, F
+from django.db.models.functions import Substr, TruncDay
+from django.http import StreamingHttpResponse, JsonResponse
 from django.urls import reverse_lazy
 from django.urls.base import reverse
-from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, TemplateView
-
-from blog.models import BlogPost
-from email_list.forms import ClientForm, MailingMessageForm, MailingSettingsForm, MailingSettingsModeratorsForm
-from email_list.models import Client, MailingMessage, MailingSettings, Attempt
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.views import View
+from django.views.generic import ListView, CreateView, DetailView, UpdateView, DeleteView, TemplateView, FormView
+from django.views.generic.list import MultipleObjectMixin
+
+from blog.services import get_random_posts
+from email_list.client_io import detect_format, import_clients, iter_export, open_text
+from email_list.forms import ClientImportForm, ClientForm, MailingMessageForm, MailingSettingsForm, \
+    MailingSettingsModeratorsForm, SegmentForm
+from email_list.models import Client, MailingMessage, MailingSettings, Attempt, Segment, DeliveryStat
+from email_list.pagination import KeysetPaginationMixin
+from email_list.search import search, get_search_scopes
+from email_list.services import get_counters
 
 
 class MainPageView(TemplateView):
@@ -16,11 +28,83 @@ class MainPageView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        context_data['count_mailing_settings'] = len(MailingSettings.objects.all())
-        context_data['count_active_mailing_settings'] = len(MailingSettings.objects.filter(is_active=True))
-        context_data['clients'] = len(Client.objects.all())
-        context_data['blog_list'] = random.sample(list(BlogPost.objects.all()), len(list(BlogPost.objects.all())))[:3]
+        counters = get_counters()
+        context_data['count_mailing_settings'] = counters.get('mailings', 0)
+        context_data['count_active_mailing_settings'] = counters.get('active_mailings', 0)
+        context_data['clients'] = counters.get('clients', 0)
+        context_data['blog_list'] = get_random_posts(3)
+
+        return context_data
+
+
+class SearchView(ListView):
+    """Полнотекстовый поиск по клиентам, сообщениям и блогу, результаты по релевантности"""
+    template_name = 'email_list/search.html'
+    paginate_by = 20
 
+    def get(self, request, *args, **kwargs):
+        self.query = request.GET.get('q', '').strip()
+        self.scopes = get_search_scopes(request.user)
+        self.scope = request.GET.get('scope')
+        if self.scope not in self.scopes:
+            self.scope = next(iter(self.scopes))
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        if not self.query:
+            return self.scopes[self.scope][1].none()
+        return search(self.scopes[self.scope][1], self.query)
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data['query'] = self.query
+        context_data['scope'] = self.scope
+        context_data['scopes'] = [(name, title) for name, (title, _) in self.scopes.items()]
+        context_data['extra_query'] = urlencode({'q': self.query, 'scope': self.scope})
+        return context_data
+
+
+class AnalyticsView(LoginRequiredMixin, TemplateView):
+    """Отчёт по отправкам за последние дни по дням или часам, строится по часовой статистике DeliveryStat"""
+    template_name = 'email_list/analytics.html'
+    max_days = 90
+
+    def get_days(self):
+        days = self.request.GET.get('days', '')
+        return min(int(days), self.max_days) if days.isdigit() and int(days) > 0 else 7
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = DeliveryStat.objects.filter(hour__gte=timezone.now() - timedelta(days=self.get_days()))
+        if not (user.is_superuser or user.has_perm('email_list.stop_mailing')):
+            queryset = queryset.filter(owner=user)
+        mailing = self.request.GET.get('mailing', '')
+        if mailing.isdigit():
+            queryset = queryset.filter(mailing_settings_id=mailing)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        queryset = self.get_queryset()
+        period = 'hour' if self.request.GET.get('period') == 'hour' else 'day'
+        totals = {'sent': Sum('sent_count'), 'success': Sum('success_count'), 'failure': Sum('failure_count')}
+
+        rows = list(queryset.annotate(
+            bucket=F('hour') if period == 'hour' else TruncDay('hour'),
+        ).values('bucket').annotate(**totals).order_by('bucket'))
+        max_sent = max((row['sent'] for row in rows), default=0)
+        for row in rows:
+            row['width'] = round(row['sent'] * 100 / max_sent) if max_sent else 0
+            row['success_percent'] = round(row['success'] * 100 / row['sent']) if row['sent'] else 0
+            row['failure_percent'] = 100 - row['success_percent'] if row['sent'] else 0
+
+        context_data['rows'] = rows
+        context_data['mailings'] = queryset.values(
+            'mailing_settings_id', 'mailing_settings__mail_message__subject', 'owner__email',
+        ).annotate(**totals).order_by('-sent')[:50]
+        context_data['period'] = period
+        context_data['days'] = self.get_days()
+        context_data['mailing'] = self.request.GET.get('mailing', '')
         return context_data
 
 
@@ -34,16 +118,71 @@ class ClientCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy('email_list:client_list')
 
     def form_valid(self, form):
-        client = form.save()
-        client.owner = self.request.user
-        client.save()
-
+        form.instance.owner = self.request.user
         return super().form_valid(form)
 
 
-class ClientListView(LoginRequiredMixin, ListView):
+class OwnerQuerysetMixin:
+    """Пользователь видит только свои записи, суперпользователь — все"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(owner=self.request.user)
+
+
+class ClientListView(LoginRequiredMixin, KeysetPaginationMixin, OwnerQuerysetMixin, ListView):
+    model = Client
+    sort_fields = {'id': 'pk', 'email': 'email', 'last_name': 'last_name'}
+
+
+class ClientImportView(LoginRequiredMixin, FormView):
+    form_class = ClientImportForm
+    template_name = 'email_list/client_import.html'
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        report = import_clients(open_text(upload.file), detect_format(upload.name), owner=self.request.user)
+        return self.render_to_response(self.get_context_data(form=form, report=report))
+
+
+class ClientExportView(LoginRequiredMixin, OwnerQuerysetMixin, MultipleObjectMixin, View):
+    """Выгрузка клиентов потоком, файл не собирается в памяти"""
     model = Client
 
+    def get(self, request, *args, **kwargs):
+        file_format = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+        response = StreamingHttpResponse(iter_export(self.get_queryset(), file_format),
+                                         content_type='text/csv' if file_format == 'csv' else 'application/jsonl')
+        response['Content-Disposition'] = f'attachment; filename="clients.{file_format}"'
+        return response
+
+
+class ClientSearchView(LoginRequiredMixin, View):
+    """
+    Поиск получателей для формы рассылки по началу почты или фамилии среди своих клиентов.
+    Ответ постраничный: следующая страница запрашивается с after=next_cursor.
+    """
+    page_size = 20
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        clients = Client.objects.filter(owner=request.user).order_by('pk')
+        if query:
+            clients = clients.filter(Q(email__istartswith=query) | Q(last_name__istartswith=query))
+        after = request.GET.get('after', '')
+        if after.isdigit():
+            clients = clients.filter(pk__gt=after)
+
+        clients = list(clients.only('pk', 'email', 'first_name', 'last_name', 'patronymic')[:self.page_size + 1])
+        has_next = len(clients) > self.page_size
+        clients = clients[:self.page_size]
+        return JsonResponse({
+            'results': [{'id': client.pk, 'text': str(client)} for client in clients],
+            'next_cursor': clients[-1].pk if has_next else None,
+        })
+
 
 class ClientDetailView(LoginRequiredMixin, DetailView):
     model = Client
@@ -68,15 +207,13 @@ class MailingMessageCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy('email_list:mailing_message_list')
 
     def form_valid(self, form):
-        message = form.save()
-        message.owner = self.request.user
-        message.save()
-
+        form.instance.owner = self.request.user
         return super().form_valid(form)
 
 
-class MailingMessageListView(LoginRequiredMixin, ListView):
+class MailingMessageListView(LoginRequiredMixin, KeysetPaginationMixin, OwnerQuerysetMixin, ListView):
     model = MailingMessage
+    sort_fields = {'id': 'pk', 'subject': 'subject'}
 
 
 class MailingMessageDetailView(LoginRequiredMixin, DetailView):
@@ -96,16 +233,52 @@ class MailingMessageDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('email_list:mailing_message_list')
 
 
+class SegmentCreateView(LoginRequiredMixin, CreateView):
+    model = Segment
+    form_class = SegmentForm
+    success_url = reverse_lazy('email_list:segment_list')
+
+    def form_valid(self, form):
+        form.instance.owner = self.request.user
+        return super().form_valid(form)
+
+
+class SegmentListView(LoginRequiredMixin, KeysetPaginationMixin, OwnerQuerysetMixin, ListView):
+    model = Segment
+
+
+class SegmentDetailView(LoginRequiredMixin, OwnerQuerysetMixin, DetailView):
+    model = Segment
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        clients = self.object.get_clients()
+        context_data['clients_count'] = clients.count()
+        context_data['clients_preview'] = clients.order_by('pk').only(
+            'email', 'first_name', 'last_name', 'patronymic')[:20]
+        return context_data
+
+
+class SegmentUpdateView(LoginRequiredMixin, OwnerQuerysetMixin, UpdateView):
+    model = Segment
+    form_class = SegmentForm
+
+    def get_success_url(self):
+        return reverse('email_list:segment_detail', args=[self.kwargs.get('pk')])
+
+
+class SegmentDeleteView(LoginRequiredMixin, OwnerQuerysetMixin, DeleteView):
+    model = Segment
+    success_url = reverse_lazy('email_list:segment_list')
+
+
 class MailingSettingsCreateView(LoginRequiredMixin, CreateView):
     model = MailingSettings
     form_class = MailingSettingsForm
     success_url = reverse_lazy('email_list:mailing_settings_list')
 
     def form_valid(self, form):
-        settings = form.save()
-        settings.owner = self.request.user
-        settings.save()
-
+        form.instance.owner = self.request.user
         return super().form_valid(form)
 
     def get_form_kwargs(self):
@@ -116,19 +289,21 @@ class MailingSettingsCreateView(LoginRequiredMixin, CreateView):
 
 class MailingSettingsListView(LoginRequiredMixin, ListView):
     model = MailingSettings
+    paginate_by = 20
 
-    def get_context_data(self, **kwargs):
-        context_data = super().get_context_data(**kwargs)
-        mailing_list = MailingSettings.objects.all()
-
-        for mailing in mailing_list:
-
-            if Attempt.objects.filter(mailing_settings=mailing).exists():
-                attempt = Attempt.objects.filter(mailing_settings=mailing)[0]
-                mailing.attempt_pk = int(attempt.pk)
-
-        context_data['object_list'] = mailing_list
-        return context_data
+    def get_queryset(self):
+        user = self.request.user
+        latest_attempt = Attempt.objects.filter(mailing_settings=OuterRef('pk')).order_by(
+            '-last_attempt_datetime').values('pk')[:1]
+        queryset = (
+            MailingSettings.objects.select_related('mail_message')
+            .only('start_datetime', 'end_datetime', 'owner', 'mail_message__subject')
+            .annotate(attempt_pk=Subquery(latest_attempt), message_preview=Substr('mail_message__message', 1, 200))
+            .order_by('-pk')
+        )
+        if not (user.is_superuser or user.has_perm('email_list.stop_mailing')):
+            queryset = queryset.filter(owner=user)
+        return queryset
 
 
 class MailingSettingsDetailView(LoginRequiredMixin, DetailView):
@@ -150,6 +325,12 @@ class MailingSettingsUpdateView(LoginRequiredMixin, UpdateView):
             return MailingSettingsModeratorsForm
         raise PermissionDenied
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        if self.get_form_class() is MailingSettingsForm:
+            kwargs['user'] = self.request.user
+        return kwargs
+
 
 class MailingSettingsDeleteView(LoginRequiredMixin, DeleteView):
     model = MailingSettings
@@ -158,3 +339,13 @@ class MailingSettingsDeleteView(LoginRequiredMixin, DeleteView):
 
 class AttemptDetailView(LoginRequiredMixin, DetailView):
     model = Attempt
+
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        failed_deliveries = self.object.delivery_set.filter(is_success=False)
+        if self.object.last_attempt_datetime:
+            # Доставки попытки не раньше её начала, условие по created_at отсекает секции журнала за прошлые месяцы
+            failed_deliveries = failed_deliveries.filter(created_at__gte=self.object.last_attempt_datetime)
+        context_data['failed_deliveries'] = failed_deliveries.only(
+            'email', 'smtp_code', 'server_response', 'created_at')[:100]
+        return context_data
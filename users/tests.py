@@ -1,3 +1,20 @@
-from django.test import TestCase
+from django.test import TestCase, tag
 
-# Create your tests here.
+from config.testing import PageBudgetMixin
+from users import urls
+
+
+@tag('performance')
+class UsersPageBudgetTest(PageBudgetMixin, TestCase):
+    url_module = urls
+    pages = {
+        'users:login': (None, 4),
+        'users:logout': (None, 4),
+        'users:register': (None, 4),
+        'users:email_confirm': (lambda data: {'token': data.other.token}, 2),
+        'users:new_password': (None, 4),
+        'users:users_list': (None, 5),
+        'users:user_detail': (lambda data: {'pk': data.other.pk}, 5),
+        'users:user_change': (lambda data: {'pk': data.other.pk}, 5),
+        'users:user_delete': (lambda data: {'pk': data.other.pk}, 5),
+    }
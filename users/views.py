@@ -3,12 +3,11 @@ import secrets
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.core.mail import send_mail
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
 
-from config.settings import EMAIL_HOST_USER
+from email_list.services import send_service_email
 from users.forms import UserCreateForm, UserForm, UserUpdateForm, UserUpdateModeratorForm
 from users.models import User
 
@@ -26,10 +25,9 @@ class UserCreateView(CreateView):
         user.save()
         host = self.request.get_host()
         url = f'http://{host}/users/email-confirm/{token}/'
-        send_mail(
+        send_service_email(
             subject='Подтверждение почты',
             message=f'Привет! Перейди по ссылке, чтобы подтвердить свою почту {url}',
-            from_email=EMAIL_HOST_USER,
             recipient_list=[user.email]
         )
 
@@ -80,12 +78,11 @@ def new_password(request):
         new_pass = secrets.token_hex(6)
         user.password = make_password(new_pass)
         user.save()
-        send_mail(
+        send_service_email(
             subject='Смена пароля',
             message=f'На аккаунте установлен новый пароль: {new_pass}',
-            from_email=EMAIL_HOST_USER,
             recipient_list=[user.email],
-            fail_silently=False
+            use_outbox=False,
         )
         return redirect(reverse('users:login'))
     return render(request, 'users/new_password.html')